@@ -1,4 +1,7 @@
 from maze_environment import load_level, show_level, save_level_costs
+from grid_engine import grid_shortest_path
+from distance_fields import cached_route
+from jps import jps_shortest_path
 from math import inf, sqrt
 from heapq import heappop, heappush
 
@@ -30,7 +33,7 @@ def dijkstras_shortest_path(initial_position, destination, graph, adj):
         # investigate children
         for (child, step_cost) in adj(graph, cell):
             # calculate cost along this path to child
-            cost_to_child = priority + transition_cost(graph, cell, child)
+            cost_to_child = priority + step_cost
             if child not in pathcosts or cost_to_child < pathcosts[child]:
                 pathcosts[child] = cost_to_child            # update the cost
                 paths[child] = cell                         # set the backpointer
@@ -39,9 +42,12 @@ def dijkstras_shortest_path(initial_position, destination, graph, adj):
     return False
 
 def path_to_cell(cell, paths):
-    if cell == []:
-        return []
-    return path_to_cell(paths[cell], paths) + [cell]
+    path = []
+    while cell != []:
+        path.append(cell)
+        cell = paths[cell]
+    path.reverse()
+    return path
     
 
 
@@ -76,13 +82,16 @@ def transition_cost(level, cell, cell2):
     return distance * average_cost
 
 
-def test_route(filename, src_waypoint, dst_waypoint):
+def test_route(filename, src_waypoint, dst_waypoint, method='dijkstra'):
     """ Loads a level, searches for a path between the given waypoints, and displays the result.
 
     Args:
         filename: The name of the text file containing the level.
         src_waypoint: The character associated with the initial waypoint.
         dst_waypoint: The character associated with the destination waypoint.
+        method: 'dijkstra' for dijkstras_shortest_path, 'grid' for the flat array engine in grid_engine,
+            'fields' to follow the cached distance fields of the level's waypoints (see distance_fields), or 'jps'
+            for Jump Point Search, which falls back to plain A* around cells of unusual cost.
 
     """
 
@@ -95,7 +104,14 @@ def test_route(filename, src_waypoint, dst_waypoint):
     dst = level['waypoints'][dst_waypoint]
 
     # Search for and display the path from src to dst.
-    path = dijkstras_shortest_path(src, dst, level, navigation_edges)
+    if method == 'grid':
+        path = grid_shortest_path(src, dst, level)
+    elif method == 'fields':
+        path = cached_route(level, src_waypoint, dst_waypoint)
+    elif method == 'jps':
+        path = jps_shortest_path(src, dst, level)
+    else:
+        path = dijkstras_shortest_path(src, dst, level, navigation_edges)
     if path:
         show_level(level, path)
     else:
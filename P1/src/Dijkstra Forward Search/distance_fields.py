@@ -0,0 +1,150 @@
+# Precomputes and caches the distance from every waypoint of a level to every cell, so routes between waypoints can
+# be read off the cached fields without searching
+
+import hashlib
+import os
+from math import inf
+from multiprocessing import Pool
+
+import numpy
+
+from grid_engine import build_grid, cell_index, grid_search, index_cell
+
+# Next to this module, so the cache does not depend on the directory the scripts are run from
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'distance_fields')
+
+
+def level_hash(grid):
+    """ Returns a hex digest identifying a level by the contents of its grid. """
+    digest = hashlib.sha1()
+    digest.update(numpy.array([grid['width'], grid['height'], grid['x_lo'], grid['y_lo']]).tobytes())
+    digest.update(grid['cost'].tobytes())
+    return digest.hexdigest()
+
+
+def field_filename(grid, waypoint, source, cache_dir=CACHE_DIR):
+    """ Returns the name of the .npy file holding the distance field of a waypoint at the grid index source. The
+    index is part of the name, since moving a waypoint leaves the costs of the grid unchanged. """
+    return os.path.join(cache_dir, '%s_%s_%d.npy' % (level_hash(grid), waypoint, source))
+
+
+# Each worker process receives the grid once, when the pool starts, instead of with every task.
+_worker_grid = None
+
+
+def _init_worker(grid):
+    global _worker_grid
+    _worker_grid = grid
+
+
+def _worker_field(source):
+    distance, _ = grid_search(_worker_grid, source)
+    return numpy.array(distance)
+
+
+def compute_fields(level, grid=None, cache_dir=CACHE_DIR, processes=None):
+    """ Computes the distance field of every waypoint of a level, or loads it from the cache.
+
+    A distance field holds, for every cell of the level's grid, the cost of the cheapest path from the waypoint to
+    that cell (inf if there is none). The fields missing from the cache are computed in parallel, one full Dijkstra
+    search per waypoint, and saved as .npy files named after a hash of the level and the waypoint's cell, so editing
+    the level or moving the waypoint invalidates them.
+
+    Args:
+        level: A loaded level, containing walls, spaces, and waypoints.
+        grid: The level's grid, if it was already built with build_grid.
+        cache_dir: The directory holding the .npy files.
+        processes: The size of the process pool; by default, one process per missing field up to the CPU count.
+
+    Returns:
+        A dict mapping each waypoint character to its distance field (a flat array indexed like the grid).
+
+    """
+    if grid is None:
+        grid = build_grid(level)
+
+    fields = {}
+    missing = []
+    sources = []
+    for waypoint in sorted(level['waypoints']):
+        source = cell_index(grid, level['waypoints'][waypoint])
+        filename = field_filename(grid, waypoint, source, cache_dir)
+        if os.path.exists(filename):
+            fields[waypoint] = numpy.load(filename, mmap_mode='r')
+        else:
+            missing.append(waypoint)
+            sources.append(source)
+
+    if missing:
+        if processes is None:
+            processes = min(len(missing), os.cpu_count() or 1)
+        if processes > 1:
+            with Pool(processes, initializer=_init_worker, initargs=(grid,)) as pool:
+                results = pool.map(_worker_field, sources)
+        else:
+            _init_worker(grid)
+            results = [_worker_field(source) for source in sources]
+
+        os.makedirs(cache_dir, exist_ok=True)
+        for waypoint, source, field in zip(missing, sources, results):
+            numpy.save(field_filename(grid, waypoint, source, cache_dir), field)
+            fields[waypoint] = field
+
+    return fields
+
+
+def route_from_field(grid, field, initial_position, destination):
+    """ Follows a distance field downhill from a cell to the waypoint it was computed from.
+
+    Each step goes to the neighbor for which the move cost plus the neighbor's distance is smallest, which is the
+    next cell of a shortest path, so no search is needed.
+
+    Args:
+        grid: The level's grid.
+        field: The distance field of the destination.
+        initial_position: The initial cell from which the path extends.
+        destination: The cell the field was computed from.
+
+    Returns:
+        If a path exists, the list of cells from initial_position to destination. Otherwise, None.
+
+    """
+    cost = grid['cost']
+    index = cell_index(grid, initial_position)
+    goal = cell_index(grid, destination)
+    if field[index] == inf:
+        return None
+
+    path = [initial_position]
+    visited = {index}  # Cells of cost 0 make flat stretches in the field, where a step could otherwise turn back.
+    while index != goal:
+        best, best_index = inf, -1
+        for offset, length in grid['moves']:
+            child = index + offset
+            if cost[child] == inf or child in visited:
+                continue
+            total = length * (cost[index] + cost[child]) / 2 + field[child]
+            if total < best:
+                best, best_index = total, child
+        if best_index == -1:
+            return None  # Every way on has been taken already: the field does not lead to destination.
+        index = best_index
+        visited.add(index)
+        path.append(index_cell(grid, index))
+
+    return path
+
+
+def cached_route(level, src_waypoint, dst_waypoint, grid=None, cache_dir=CACHE_DIR):
+    """ Finds the route between two waypoints using their cached distance fields, computing the fields of the
+    level first if they are not cached yet.
+
+    Returns:
+        If a path exists, the list of cells from the source waypoint to the destination waypoint. Otherwise, None.
+
+    """
+    if grid is None:
+        grid = build_grid(level)
+    fields = compute_fields(level, grid, cache_dir)
+    waypoints = level['waypoints']
+    return route_from_field(grid, fields[dst_waypoint], waypoints[src_waypoint], waypoints[dst_waypoint])
@@ -0,0 +1,200 @@
+# Benchmarks the grid search engines on generated levels
+
+import argparse
+import random
+import tempfile
+from math import inf
+from timeit import default_timer as time
+
+from Dijkstra_forward_search import dijkstras_shortest_path, navigation_edges, transition_cost
+from distance_fields import compute_fields, route_from_field
+from grid_engine import build_grid, grid_shortest_path
+from jps import jps_shortest_path
+
+
+def generate_level(width, height, clutter=0.1, weighted=0.0, seed=0, waypoint_count=2):
+    """ Generates a level in the format of load_level: a border of walls, randomly placed wall blocks, and waypoints
+    'a' and 'b' in opposite corners, followed by 'c', 'd', ... at random spaces.
+
+    Args:
+        width, height: The size of the level, walls included.
+        clutter: The fraction of the cells covered by wall blocks.
+        weighted: The fraction of the cells covered by patches of cost 2 to 9 (the other spaces cost 1), at most
+            all the spaces.
+        seed: The seed of the random generator.
+        waypoint_count: The number of waypoints, at least 2.
+
+    Returns:
+        The generated level (dict).
+
+    """
+    rng = random.Random(seed)
+    walls = {(i, j) for i in range(width) for j in (0, height - 1)}
+    walls.update((i, j) for i in (0, width - 1) for j in range(height))
+
+    # Blocks of a few cells keep the clutter from being uniform noise.
+    # Both kinds of patches are capped at the cells available to them, or the loops would never end.
+    interior = (width - 2) * (height - 2)
+    blocked = set()
+    while len(blocked) < min(clutter * width * height, interior):
+        i, j = rng.randrange(1, width - 1), rng.randrange(1, height - 1)
+        w, h = rng.randint(1, 4), rng.randint(1, 4)
+        blocked.update((x, y) for x in range(i, min(i + w, width - 1)) for y in range(j, min(j + h, height - 1)))
+
+    costs = {}
+    while len(costs) < min(weighted * width * height, interior - len(blocked)):
+        i, j = rng.randrange(1, width - 1), rng.randrange(1, height - 1)
+        size, cost = rng.randint(2, 8), float(rng.randint(2, 9))
+        costs.update(((x, y), cost) for x in range(i, min(i + size, width - 1))
+                     for y in range(j, min(j + size, height - 1)) if (x, y) not in blocked)
+
+    waypoints = {'a': (1, 1), 'b': (width - 2, height - 2)}
+    for k in range(2, waypoint_count):
+        waypoints[chr(ord('a') + k)] = (rng.randrange(1, width - 1), rng.randrange(1, height - 1))
+    blocked.difference_update(waypoints.values())
+    walls.update(blocked)
+
+    spaces = {}
+    for j in range(1, height - 1):
+        for i in range(1, width - 1):
+            if (i, j) not in blocked:
+                spaces[(i, j)] = costs.get((i, j), 1.)
+    for cell in waypoints.values():
+        spaces[cell] = 1.
+
+    return {'walls': walls, 'spaces': spaces, 'waypoints': waypoints}
+
+
+def path_cost(level, path):
+    """ Returns the total cost of a path of adjacent cells. """
+    if not path:
+        return inf
+    return sum(transition_cost(level, a, b) for a, b in zip(path, path[1:]))
+
+
+def bench_engine(sizes, clutter, weighted, dict_limit, seed):
+    print("%-12s %10s %12s %12s %12s %10s" % ("level", "spaces", "dict s", "build s", "grid s", "same cost"))
+    for size in sizes:
+        level = generate_level(size, size, clutter, weighted, seed)
+        src, dst = level['waypoints']['a'], level['waypoints']['b']
+
+        start = time()
+        grid = build_grid(level)
+        build_time = time() - start
+
+        start = time()
+        path = grid_shortest_path(src, dst, level, grid)
+        grid_time = time() - start
+
+        if size <= dict_limit:
+            start = time()
+            expected = dijkstras_shortest_path(src, dst, level, navigation_edges)
+            dict_time = "%12.2f" % (time() - start)
+            cost, expected_cost = path_cost(level, path), path_cost(level, expected)
+            same = "%10s" % (cost == expected_cost or abs(cost - expected_cost) < 1e-6)
+        else:
+            dict_time, same = "%12s" % "-", "%10s" % "-"
+
+        print("%-12s %10d %s %12.2f %12.2f %s" % (
+            "%dx%d" % (size, size), len(level['spaces']), dict_time, build_time, grid_time, same))
+
+
+def bench_fields(size, waypoint_count, clutter, weighted, processes, seed):
+    level = generate_level(size, size, clutter, weighted, seed, waypoint_count)
+    grid = build_grid(level)
+    waypoints = level['waypoints']
+    pairs = [(a, b) for a in sorted(waypoints) for b in sorted(waypoints) if a != b]
+    print("%dx%d level, %d waypoints, %d routes" % (size, size, len(waypoints), len(pairs)))
+
+    start = time()
+    expected = [grid_shortest_path(waypoints[a], waypoints[b], level, grid) for a, b in pairs]
+    print("%-36s %8.2f s" % ("one A* search per route", time() - start))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("fields computed, then routes", "fields from cache, then routes"):
+            start = time()
+            fields = compute_fields(level, grid, cache_dir, processes)
+            field_time = time() - start
+            start = time()
+            routes = [route_from_field(grid, fields[b], waypoints[a], waypoints[b]) for a, b in pairs]
+            route_time = time() - start
+            print("%-36s %8.2f s  (fields %.2f s, routes %.1f ms)" % (
+                label, field_time + route_time, field_time, 1e3 * route_time))
+
+    same = all(path_cost(level, route) == path_cost(level, path) or
+               abs(path_cost(level, route) - path_cost(level, path)) < 1e-6 for route, path in zip(routes, expected))
+    print("same costs: %s" % same)
+
+
+# Generated level kinds for the Jump Point Search benchmark: (clutter, weighted).
+MAZES = {'open': (0.02, 0.0), 'cluttered': (0.3, 0.0), 'weighted': (0.1, 0.3)}
+
+
+def bench_jps(sizes, dict_limit, seed):
+    print("%-10s %-12s %12s %12s %12s %10s %10s %10s %10s" % (
+        "maze", "level", "dijkstra exp", "grid exp", "jps exp", "dijkstra s", "grid s", "jps s", "same cost"))
+    for name, (clutter, weighted) in MAZES.items():
+        for size in sizes:
+            level = generate_level(size, size, clutter, weighted, seed)
+            grid = build_grid(level)
+            src, dst = level['waypoints']['a'], level['waypoints']['b']
+
+            if size <= dict_limit:
+                # The adjacency function is called once for every cell the dictionary version expands.
+                calls = [0]
+
+                def counting_edges(graph, cell):
+                    calls[0] += 1
+                    return navigation_edges(graph, cell)
+
+                start = time()
+                dijkstras_shortest_path(src, dst, level, counting_edges)
+                dijkstra = "%12d" % calls[0], "%10.3f" % (time() - start)
+            else:
+                dijkstra = "%12s" % "-", "%10s" % "-"
+
+            grid_stats, jps_stats = {}, {}
+            start = time()
+            expected = grid_shortest_path(src, dst, level, grid, grid_stats)
+            grid_time = time() - start
+            start = time()
+            path = jps_shortest_path(src, dst, level, grid, jps_stats)
+            jps_time = time() - start
+
+            cost, expected_cost = path_cost(level, path), path_cost(level, expected)
+            print("%-10s %-12s %s %12d %12d %s %10.3f %10.3f %10s" % (
+                name, "%dx%d" % (size, size), dijkstra[0], grid_stats['expanded'], jps_stats['expanded'],
+                dijkstra[1], grid_time, jps_time, cost == expected_cost or abs(cost - expected_cost) < 1e-6))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmarks the grid search engines on generated levels.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clutter', type=float, default=0.2, help="fraction of the level covered by walls")
+    parser.add_argument('--weighted', type=float, default=0.2, help="fraction of the level with costs above 1")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    engine_parser = subparsers.add_parser('engine', help="dijkstras_shortest_path against the flat array engine")
+    engine_parser.add_argument('--sizes', type=int, nargs='+', default=[100, 300, 1000, 2000])
+    engine_parser.add_argument('--dict-limit', type=int, default=1000,
+                               help="skip the dictionary version on levels larger than this")
+
+    fields_parser = subparsers.add_parser('fields', help="routes between all waypoints from cached distance fields")
+    fields_parser.add_argument('--size', type=int, default=500)
+    fields_parser.add_argument('--waypoints', type=int, default=6)
+    fields_parser.add_argument('--processes', type=int, default=None)
+
+    jps_parser = subparsers.add_parser('jps', help="Jump Point Search on open, cluttered and weighted mazes")
+    jps_parser.add_argument('--sizes', type=int, nargs='+', default=[100, 300, 1000])
+    jps_parser.add_argument('--dict-limit', type=int, default=300,
+                            help="skip the dictionary version on levels larger than this")
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'engine':
+        bench_engine(args.sizes, args.clutter, args.weighted, args.dict_limit, args.seed)
+    elif args.benchmark == 'fields':
+        bench_fields(args.size, args.waypoints, args.clutter, args.weighted, args.processes, args.seed)
+    elif args.benchmark == 'jps':
+        bench_jps(args.sizes, args.dict_limit, args.seed)
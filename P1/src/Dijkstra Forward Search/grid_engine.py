@@ -0,0 +1,171 @@
+# Runs shortest path searches over a level converted to flat NumPy arrays instead of tuple-keyed dictionaries
+
+from heapq import heappop, heappush
+from math import inf, sqrt
+
+import numpy
+
+SQRT2 = sqrt(2)
+
+
+def build_grid(level):
+    """ Converts a loaded level into a dense cost array.
+
+    The level's bounding box is padded with a ring of walls, so every cell of the level has eight neighbors in the
+    array and the search never has to check bounds. Each cell is identified by an integer index into the flattened
+    array.
+
+    Args:
+        level: A loaded level, containing walls, spaces, and waypoints.
+
+    Returns:
+        A grid (dict) containing the cost of every cell as a flat array (inf for walls and cells outside the level),
+        the width and height of the padded array, the offsets of the level's coordinates in it, the index offsets
+        and lengths of the eight moves, and the cheapest cost of any space.
+
+    """
+    xs, ys = zip(*(list(level['spaces'].keys()) + list(level['walls'])))
+    x_lo, y_lo = min(xs) - 1, min(ys) - 1
+    width, height = max(xs) - x_lo + 2, max(ys) - y_lo + 2
+
+    cost = numpy.full((height, width), inf)
+    if level['spaces']:
+        cells = numpy.array(list(level['spaces'].keys()))
+        cost[cells[:, 1] - y_lo, cells[:, 0] - x_lo] = list(level['spaces'].values())
+
+    moves = [(dx, dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1] if not (dx == 0 and dy == 0)]
+
+    return {'cost': cost.reshape(-1),
+            'width': width,
+            'height': height,
+            'x_lo': x_lo,
+            'y_lo': y_lo,
+            'moves': [(dy * width + dx, sqrt(dx * dx + dy * dy)) for dx, dy in moves],
+            'min_cost': min(level['spaces'].values(), default=1.)}
+
+
+def cell_index(grid, cell):
+    """ Returns the index of an (x, y) cell in the grid's flat arrays. """
+    return (cell[1] - grid['y_lo']) * grid['width'] + (cell[0] - grid['x_lo'])
+
+
+def index_cell(grid, index):
+    """ Returns the (x, y) cell at an index of the grid's flat arrays. """
+    row, column = divmod(index, grid['width'])
+    return column + grid['x_lo'], row + grid['y_lo']
+
+
+def octile_distance(grid, index, goal):
+    """ A lower bound on the cost between two cells: the length of the shortest 8-connected move sequence between
+    them, times the cheapest cost of any cell. """
+    dy, dx = divmod(index, grid['width'])
+    gy, gx = divmod(goal, grid['width'])
+    dx, dy = abs(dx - gx), abs(dy - gy)
+    return (max(dx, dy) + (SQRT2 - 1) * min(dx, dy)) * grid['min_cost']
+
+
+def grid_search(grid, source, destination=None, heuristic=True, stats=None):
+    """ Searches the grid with Dijkstra's algorithm, or with A* when a destination is given and heuristic is set.
+
+    Moves and their costs are the same as navigation_edges: any of the eight neighbors that is a space, for the
+    length of the move times the average cost of the two cells.
+
+    Args:
+        grid: A grid built by build_grid.
+        source: The index of the initial cell.
+        destination: The index of the destination cell. Without one, the distance to every reachable cell is found.
+        heuristic: Whether to guide the search toward the destination with octile_distance.
+        stats: An optional dict that receives 'expanded', the number of cells taken off the queue.
+
+    Returns:
+        The distance and predecessor arrays (flat lists): inf and -1 for cells that were not reached.
+
+    """
+    cost = grid['cost'].tolist()
+    moves = grid['moves']
+    size = len(cost)
+
+    distance = [inf] * size
+    prev = [-1] * size
+    closed = bytearray(size)
+    use_heuristic = heuristic and destination is not None
+
+    # The octile heuristic is computed inline; it is the same as octile_distance.
+    width, min_cost = grid['width'], grid['min_cost']
+    if use_heuristic:
+        goal_y, goal_x = divmod(destination, width)
+
+    distance[source] = 0
+    queue = [(0, 0, source)]
+    expanded = 0
+
+    while queue:
+        _, path_cost, index = heappop(queue)
+        if closed[index]:
+            continue
+        closed[index] = 1
+        expanded += 1
+        if index == destination:
+            break
+
+        cell_cost = cost[index]
+        for offset, length in moves:
+            child = index + offset
+            child_cost = cost[child]
+            if child_cost == inf or closed[child]:
+                continue
+            cost_to_child = path_cost + length * (cell_cost + child_cost) / 2
+            if cost_to_child < distance[child]:
+                distance[child] = cost_to_child
+                prev[child] = index
+                priority = cost_to_child
+                if use_heuristic:
+                    dy, dx = divmod(child, width)
+                    dx, dy = abs(dx - goal_x), abs(dy - goal_y)
+                    priority += (max(dx, dy) + (SQRT2 - 1) * min(dx, dy)) * min_cost
+                heappush(queue, (priority, cost_to_child, child))
+
+    if stats is not None:
+        stats['expanded'] = expanded
+
+    return distance, prev
+
+
+def path_from_prev(grid, prev, destination):
+    """ Walks the predecessor array back from the destination.
+
+    Returns:
+        The list of (x, y) cells from the search's initial cell to the destination.
+
+    """
+    path = []
+    index = destination
+    while index != -1:
+        path.append(index_cell(grid, index))
+        index = prev[index]
+    path.reverse()
+    return path
+
+
+def grid_shortest_path(initial_position, destination, level, grid=None, stats=None):
+    """ Same interface as dijkstras_shortest_path, using the flat array engine.
+
+    Args:
+        initial_position: The initial cell from which the path extends.
+        destination: The end location for the path.
+        level: A loaded level, containing walls, spaces, and waypoints.
+        grid: The level's grid, if it was already built with build_grid.
+        stats: An optional dict that receives search counters.
+
+    Returns:
+        If a path exists, return a list containing all cells from initial_position to destination.
+        Otherwise, return None.
+
+    """
+    if grid is None:
+        grid = build_grid(level)
+    source, goal = cell_index(grid, initial_position), cell_index(grid, destination)
+    distance, prev = grid_search(grid, source, goal, stats=stats)
+    if distance[goal] == inf:
+        return None
+    return path_from_prev(grid, prev, goal)
@@ -0,0 +1,223 @@
+# Jump Point Search over the flat array grids of grid_engine, falling back to plain A* expansion around cells whose
+# cost differs from the rest of the level
+
+from collections import Counter
+from heapq import heappop, heappush
+from math import inf
+
+import numpy
+
+from grid_engine import SQRT2, build_grid, cell_index, index_cell
+
+
+def jump_data(grid):
+    """ Finds the cells where jumps have to stop, and stores them with the grid.
+
+    Jump Point Search relies on every move in a direction costing the same, which only holds among cells of one
+    cost. The most common cost of the level is the uniform cost; a cell with another cost, or next to one, is a stop
+    cell: jumps end there, and it is expanded toward all eight neighbors like in plain A*.
+
+    Returns:
+        A dict containing the uniform cost and the stop flag of every cell (a bytearray indexed like the grid).
+
+    """
+    if 'jps' not in grid:
+        cost = grid['cost'].reshape(grid['height'], grid['width'])
+        spaces = cost[numpy.isfinite(cost)]
+        uniform = Counter(spaces.tolist()).most_common(1)[0][0] if spaces.size else 1.
+
+        weighted = numpy.isfinite(cost) & (cost != uniform)
+        stop = weighted.copy()
+        # The padding ring of walls keeps the weighted cells off the border, so the shifts do not wrap around.
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                stop |= numpy.roll(numpy.roll(weighted, dy, axis=0), dx, axis=1)
+        stop &= numpy.isfinite(cost)
+
+        grid['jps'] = {'uniform_cost': uniform, 'stop': bytearray(stop.reshape(-1).astype(numpy.uint8).tobytes())}
+    return grid['jps']
+
+
+def jps_search(grid, source, destination, stats=None):
+    """ Searches the grid with Jump Point Search.
+
+    Moves and costs are the same as in grid_search, diagonal moves past wall corners included, and the path found is
+    as cheap. Instead of queuing every neighbor, the search jumps in a straight or diagonal line until it reaches a
+    cell where an optimal path may have to turn (a jump point): a cell with a forced neighbor, the destination, or a
+    stop cell from jump_data. Only jump points are queued and expanded.
+
+    Args:
+        grid: A grid built by grid_engine.build_grid.
+        source: The index of the initial cell.
+        destination: The index of the destination cell.
+        stats: An optional dict that receives 'expanded', the number of jump points taken off the queue.
+
+    Returns:
+        The distance and predecessor dicts of the jump points reached. Consecutive jump points are joined by a
+        straight or diagonal line.
+
+    """
+    cost = grid['cost'].tolist()
+    width = grid['width']
+    min_cost = grid['min_cost']
+    data = jump_data(grid)
+    uniform, stop = data['uniform_cost'], data['stop']
+    wall = bytearray(c == inf for c in cost)
+    goal_y, goal_x = divmod(destination, width)
+
+    def free(index):
+        return not wall[index]
+
+    def scan(index, step, side):
+        """ Looks for a jump point on a straight line, without its cost: the line moves by step, and side is the
+        offset of the cells on either side of it. """
+        while True:
+            index += step
+            if wall[index]:
+                return False
+            if index == destination or stop[index]:
+                return True
+            if (wall[index + side] and not wall[index + side + step]) or \
+                    (wall[index - side] and not wall[index - side + step]):
+                return True
+
+    def jump(index, dx, dy):
+        """ Moves from index in direction (dx, dy) until a jump point; returns it and the cost of the move, or
+        (-1, inf) if the line runs into a wall first. """
+        step = dy * width + dx
+        start = index
+        moves = 0
+        while True:
+            index += step
+            if wall[index]:
+                return -1, inf
+            moves += 1
+            if index == destination or stop[index]:
+                break
+            if dx and dy:
+                if (wall[index - dx] and not wall[index - dx + dy * width]) or \
+                        (wall[index - dy * width] and not wall[index + dx - dy * width]):
+                    break
+                # A diagonal move stops where one of its straight components finds a jump point.
+                if scan(index, dx, width) or scan(index, dy * width, 1):
+                    break
+            elif dx:
+                if (wall[index + width] and not wall[index + dx + width]) or \
+                        (wall[index - width] and not wall[index + dx - width]):
+                    break
+            else:
+                if (wall[index + 1] and not wall[index + 1 + dy * width]) or \
+                        (wall[index - 1] and not wall[index - 1 + dy * width]):
+                    break
+
+        # Every cell strictly between the two ends of the line is an ordinary cell of the uniform cost.
+        length = SQRT2 if dx and dy else 1.
+        return index, length * ((cost[start] + cost[index]) / 2 + (moves - 1) * uniform)
+
+    all_directions = [(dx, dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1] if not (dx == 0 and dy == 0)]
+
+    def directions(index, parent):
+        """ The directions worth jumping in from a jump point, given the jump point it was reached from. """
+        if parent == -1 or stop[index]:
+            return all_directions
+        py, px = divmod(parent, width)
+        y, x = divmod(index, width)
+        dx, dy = (x > px) - (x < px), (y > py) - (y < py)
+
+        if dx and dy:
+            result = [(dx, dy), (dx, 0), (0, dy)]
+            if not free(index - dx):
+                result.append((-dx, dy))
+            if not free(index - dy * width):
+                result.append((dx, -dy))
+        elif dx:
+            result = [(dx, 0)]
+            if not free(index + width):
+                result.append((dx, 1))
+            if not free(index - width):
+                result.append((dx, -1))
+        else:
+            result = [(0, dy)]
+            if not free(index + 1):
+                result.append((1, dy))
+            if not free(index - 1):
+                result.append((-1, dy))
+        return result
+
+    distance = {source: 0}
+    prev = {source: -1}
+    closed = set()
+    queue = [(0, 0, source)]
+    expanded = 0
+
+    while queue:
+        _, path_cost, index = heappop(queue)
+        if index in closed:
+            continue
+        closed.add(index)
+        expanded += 1
+        if index == destination:
+            break
+
+        for dx, dy in directions(index, prev[index]):
+            jump_point, travelled = jump(index, dx, dy)
+            if jump_point == -1 or jump_point in closed:
+                continue
+            cost_to_point = path_cost + travelled
+            if cost_to_point < distance.get(jump_point, inf):
+                distance[jump_point] = cost_to_point
+                prev[jump_point] = index
+                y, x = divmod(jump_point, width)
+                ddx, ddy = abs(x - goal_x), abs(y - goal_y)
+                heuristic = (max(ddx, ddy) + (SQRT2 - 1) * min(ddx, ddy)) * min_cost
+                heappush(queue, (cost_to_point + heuristic, cost_to_point, jump_point))
+
+    if stats is not None:
+        stats['expanded'] = expanded
+
+    return distance, prev
+
+
+def path_from_jumps(grid, prev, destination):
+    """ Walks the jump points back from the destination, filling in the cells of the line between each pair.
+
+    Returns:
+        The list of (x, y) cells from the search's initial cell to the destination.
+
+    """
+    path = [index_cell(grid, destination)]
+    index = destination
+    while prev[index] != -1:
+        x, y = index_cell(grid, index)
+        px, py = index_cell(grid, prev[index])
+        dx, dy = (px > x) - (px < x), (py > y) - (py < y)
+        while (x, y) != (px, py):
+            x, y = x + dx, y + dy
+            path.append((x, y))
+        index = prev[index]
+    path.reverse()
+    return path
+
+
+def jps_shortest_path(initial_position, destination, level, grid=None, stats=None):
+    """ Same interface as dijkstras_shortest_path, using Jump Point Search.
+
+    Args:
+        initial_position: The initial cell from which the path extends.
+        destination: The end location for the path.
+        level: A loaded level, containing walls, spaces, and waypoints.
+        grid: The level's grid, if it was already built with build_grid.
+        stats: An optional dict that receives search counters.
+
+    Returns:
+        If a path exists, return a list containing all cells from initial_position to destination.
+        Otherwise, return None.
+
+    """
+    if grid is None:
+        grid = build_grid(level)
+    source, goal = cell_index(grid, initial_position), cell_index(grid, destination)
+    distance, prev = jps_search(grid, source, goal, stats)
+    if goal not in distance:
+        return None
+    return path_from_jumps(grid, prev, goal)
@@ -0,0 +1,416 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import pickle
+import random
+from timeit import default_timer as time
+
+import numpy
+from matplotlib.pyplot import imread
+
+import nm_funnel
+import nm_hierarchy
+import nm_mesh_update
+import nm_meshbuilder
+import nm_pathfinder
+from nm_box_index import build_box_index, locate
+from nm_meshfile import load_mesh as load_any_mesh, save_mesh_file
+from nm_path_cache import PathCache
+from nm_query_engine import PathQueryEngine
+
+
+def load_mesh(filename):
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def random_points(mesh, count, rng):
+    """Samples points over the bounding rectangle of the mesh, so some of them fall outside every box."""
+    x_hi = max(box[1] for box in mesh['boxes'])
+    y_hi = max(box[3] for box in mesh['boxes'])
+    return [(rng.randrange(x_hi), rng.randrange(y_hi)) for _ in range(count)]
+
+
+def random_box_points(mesh, count, rng):
+    """Samples points that lie inside randomly chosen boxes of the mesh."""
+    points = []
+    for _ in range(count):
+        x1, x2, y1, y2 = rng.choice(mesh['boxes'])
+        points.append((x1 + rng.random() * (x2 - x1), y1 + rng.random() * (y2 - y1)))
+    return points
+
+
+def random_pairs(mesh, count, rng):
+    points = random_box_points(mesh, 2 * count, rng)
+    return list(zip(points[::2], points[1::2]))
+
+
+def linear_locate(boxes, point):
+    """The original point location: scan every box."""
+    for box in boxes:
+        x1, x2, y1, y2 = box
+        if x1 <= point[0] < x2 and y1 <= point[1] < y2:
+            return box
+    return None
+
+
+def bench_locate(filenames, queries, seed):
+    print("%-40s %8s %12s %12s %9s" % ("mesh", "boxes", "linear us", "index us", "speedup"))
+    for filename in filenames:
+        mesh = load_mesh(filename)
+        points = random_points(mesh, queries, random.Random(seed))
+
+        start = time()
+        index = build_box_index(mesh['boxes'])
+        build_time = time() - start
+
+        start = time()
+        expected = [linear_locate(mesh['boxes'], p) for p in points]
+        linear_time = time() - start
+
+        start = time()
+        found = [locate(index, p) for p in points]
+        index_time = time() - start
+
+        assert found == expected, "index disagrees with linear scan on %s" % filename
+
+        print("%-40s %8d %12.2f %12.2f %8.1fx   (index built in %.1f ms)" % (
+            filename, len(mesh['boxes']),
+            1e6 * linear_time / queries, 1e6 * index_time / queries,
+            linear_time / index_time, 1e3 * build_time))
+
+
+def bench_engine(filenames, queries, seed, processes):
+    print("%-40s %14s %14s %14s" % ("mesh", "find_path q/s", "engine q/s", "pool q/s"))
+    for filename in filenames:
+        mesh = load_mesh(filename)
+        pairs = random_pairs(mesh, queries, random.Random(seed))
+
+        with contextlib.redirect_stdout(io.StringIO()):  # find_path reports every failed query.
+            start = time()
+            for source, destination in pairs:
+                nm_pathfinder.find_path(source, destination, mesh)
+            find_path_time = time() - start
+
+        engine = PathQueryEngine(mesh)
+        start = time()
+        engine.find_paths(pairs)
+        engine_time = time() - start
+
+        pool_rate = '-'
+        if processes > 1:
+            engine.find_paths(pairs[:processes], processes)  # Start the workers outside of the timed region.
+            start = time()
+            engine.find_paths(pairs, processes)
+            pool_rate = '%.0f' % (queries / (time() - start))
+            engine.close()
+
+        print("%-40s %14.0f %14.0f %14s" % (filename, queries / find_path_time, queries / engine_time, pool_rate))
+
+
+def load_image(filename, scale=1):
+    """Loads a map the way nm_meshbuilder does, optionally enlarged by an integer factor."""
+    img = (imread(filename) * 255).astype(dtype=numpy.uint8)
+    if len(img.shape) > 2:
+        img = img[:, :, 0]
+    if scale > 1:
+        img = numpy.kron(img, numpy.ones((scale, scale), dtype=numpy.uint8))
+    return img
+
+
+def bench_build(filenames, min_feature_size, scale, workers, tile_size):
+    print("%-32s %12s %8s %12s %12s %12s" % ("image", "size", "boxes", "scan s", "integral s", "tiled s"))
+    for filename in filenames:
+        img = load_image(filename, scale)
+
+        start = time()
+        expected = nm_meshbuilder.build_mesh(img, min_feature_size)
+        scan_time = time() - start
+
+        start = time()
+        mesh = nm_meshbuilder.build_mesh_fast(img, min_feature_size)
+        fast_time = time() - start
+
+        assert mesh == expected, "build_mesh_fast disagrees with build_mesh on %s" % filename
+
+        start = time()
+        tiled = nm_meshbuilder.build_mesh_tiled(img, min_feature_size, tile_size, workers)
+        tiled_time = time() - start
+
+        assert tiled == mesh, "build_mesh_tiled disagrees with build_mesh_fast on %s" % filename
+
+        print("%-32s %12s %8d %12.2f %12.2f %12.2f" % (
+            filename, "%dx%d" % img.shape, len(mesh['boxes']), scan_time, fast_time, tiled_time))
+
+
+def _measure_load(filename, pairs, results):
+    """Runs in a fresh process: loads a mesh, answers a few queries, and reports the time and memory it took."""
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time()
+    mesh = load_any_mesh(filename)
+    load_time = time() - start
+    engine = PathQueryEngine(mesh)
+    engine.find_paths(pairs)
+    first_query_time = time() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((load_time, first_query_time, rss_after - rss_before))
+
+
+def bench_load(filenames, queries, seed):
+    print("%-40s %8s %10s %12s %10s" % ("mesh file", "MB", "load ms", "ready ms", "RSS KB"))
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in filenames:
+            mesh = load_mesh(filename)
+            pairs = random_pairs(mesh, queries, random.Random(seed))
+            binary = os.path.join(directory, os.path.basename(filename) + '.bin')
+            save_mesh_file(mesh, binary)
+            del mesh
+
+            for path in (filename, binary):
+                results = multiprocessing.Queue()
+                process = multiprocessing.Process(target=_measure_load, args=(path, pairs, results))
+                process.start()
+                load_time, ready_time, rss = results.get()
+                process.join()
+                label = filename if path == filename else filename.replace('.pickle', '.bin')
+                print("%-40s %8.2f %10.2f %12.2f %10d" % (
+                    label, os.path.getsize(path) / 2**20, 1e3 * load_time, 1e3 * ready_time, rss))
+
+
+def path_length(path):
+    return sum(nm_pathfinder.euclidean_distance(a, b) for a, b in zip(path, path[1:]))
+
+
+def bench_hierarchy(filenames, queries, seed, region_size):
+    print("%-40s %10s %10s %10s %10s %10s %10s" % (
+        "mesh", "build ms", "flat exp", "hpa exp", "flat ms", "hpa ms", "length"))
+    for filename in filenames:
+        mesh = load_mesh(filename)
+        mesh['index'] = build_box_index(mesh['boxes'])
+        pairs = random_pairs(mesh, queries, random.Random(seed))
+
+        start = time()
+        hierarchy = nm_hierarchy.build_hierarchy(mesh, region_size)
+        build_time = time() - start
+
+        flat_expanded, flat_time, flat_length = 0, 0.0, 0.0
+        hpa_expanded, hpa_time, hpa_length = 0, 0.0, 0.0
+        stats = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for source, destination in pairs:
+                start = time()
+                path, visited = nm_pathfinder.find_path(source, destination, mesh)
+                flat_time += time() - start
+                flat_expanded += len(visited)
+
+                start = time()
+                hpa_path, _ = nm_hierarchy.find_path(source, destination, mesh, hierarchy, stats)
+                hpa_time += time() - start
+                hpa_expanded += stats['expanded']
+
+                if path and hpa_path:
+                    flat_length += path_length(path)
+                    hpa_length += path_length(hpa_path)
+
+        print("%-40s %10.1f %10.1f %10.1f %10.3f %10.3f %9.2fx" % (
+            filename, 1e3 * build_time, flat_expanded / queries, hpa_expanded / queries,
+            1e3 * flat_time / queries, 1e3 * hpa_time / queries, hpa_length / max(flat_length, 1e-9)))
+
+
+def bench_cache(filenames, queries, seed, hotspots, capacity):
+    print("%-40s %12s %12s %10s %10s" % ("mesh", "find_path ms", "cached ms", "hit rate", "evictions"))
+    for filename in filenames:
+        mesh = load_mesh(filename)
+        rng = random.Random(seed)
+        # Queries go between a limited set of hot boxes, with fresh points inside them every time.
+        boxes = [rng.choice(mesh['boxes']) for _ in range(hotspots)]
+        pairs = []
+        for _ in range(queries):
+            (a, b, c, d), (e, f, g, h) = rng.choice(boxes), rng.choice(boxes)
+            pairs.append(((a + rng.random() * (b - a), c + rng.random() * (d - c)),
+                          (e + rng.random() * (f - e), g + rng.random() * (h - g))))
+
+        cache = PathCache(capacity)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time()
+            for source, destination in pairs:
+                nm_pathfinder.find_path(source, destination, mesh)
+            find_path_time = time() - start
+
+            start = time()
+            for source, destination in pairs:
+                cache.find_path(source, destination, mesh)
+            cached_time = time() - start
+
+        info = cache.info()
+        print("%-40s %12.3f %12.3f %9.1f%% %10d" % (
+            filename, 1e3 * find_path_time / queries, 1e3 * cached_time / queries,
+            100 * info['hits'] / queries, info['evictions']))
+
+
+def bench_update(filenames, min_feature_size, edits, seed):
+    print("%-32s %8s %12s %12s %9s" % ("image", "boxes", "rebuild ms", "update ms", "speedup"))
+    for filename in filenames:
+        img = load_image(filename)
+        mesh = nm_meshbuilder.build_mesh_fast(img, min_feature_size)
+        mesh['index'] = build_box_index(mesh['boxes'])
+        rng = random.Random(seed)
+        height, width = img.shape
+
+        # Small square edits such as doors opening and closing or walls being destroyed.
+        rebuild_time = update_time = 0.0
+        for _ in range(edits):
+            size = rng.randint(4, 24)
+            x, y = rng.randrange(height - size), rng.randrange(width - size)
+            img[x:x + size, y:y + size] = rng.choice([0, 255])
+
+            start = time()
+            nm_meshbuilder.build_mesh_fast(img, min_feature_size)
+            rebuild_time += time() - start
+
+            start = time()
+            nm_mesh_update.update_mesh(mesh, img, (x, x + size, y, y + size), min_feature_size)
+            update_time += time() - start
+
+        print("%-32s %8d %12.2f %12.2f %8.1fx" % (
+            filename, len(mesh['boxes']), 1e3 * rebuild_time / edits, 1e3 * update_time / edits,
+            rebuild_time / update_time))
+
+
+def bench_funnel(filenames, queries, seed):
+    print("%-40s %10s %12s %12s %10s %10s %10s" % (
+        "mesh", "portals ms", "find_path ms", "funnel us", "overhead", "waypoints", "length"))
+    for filename in filenames:
+        mesh = load_mesh(filename)
+        pairs = random_pairs(mesh, queries, random.Random(seed))
+
+        start = time()
+        portals = nm_funnel.get_portals(mesh)
+        portal_time = time() - start
+
+        search_time = funnel_time = 0.0
+        found = waypoints = smooth_waypoints = length = smooth_length = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            for source, destination in pairs:
+                corridor = []
+                start = time()
+                path, _ = nm_pathfinder.find_path(source, destination, mesh, corridor)
+                search_time += time() - start
+                if not path:
+                    continue
+
+                start = time()
+                smooth = nm_funnel.string_pull(source, destination, corridor, portals)
+                funnel_time += time() - start
+
+                found += 1
+                waypoints += len(path)
+                smooth_waypoints += len(smooth)
+                length += path_length(path)
+                smooth_length += path_length(smooth)
+
+        found = max(found, 1)
+        print("%-40s %10.1f %12.3f %12.1f %9.1f%% %10s %10.3f" % (
+            filename, 1e3 * portal_time, 1e3 * search_time / queries, 1e6 * funnel_time / found,
+            100 * funnel_time / search_time, "%.1f/%.1f" % (smooth_waypoints / found, waypoints / found),
+            smooth_length / max(length, 1)))
+
+
+def bench_bidirectional(filenames, queries, seed):
+    print("%-40s %12s %12s %12s %12s %10s %10s" % (
+        "mesh", "classic exp", "optimal exp", "classic ms", "optimal ms", "length", "shorter"))
+    for filename in filenames:
+        mesh = load_mesh(filename)
+        pairs = random_pairs(mesh, queries, random.Random(seed))
+
+        totals = {'classic': [0, 0.0, 0.0], 'optimal': [0, 0.0, 0.0]}
+        shorter = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            for source, destination in pairs:
+                lengths = {}
+                for mode in totals:
+                    start = time()
+                    path, visited = nm_pathfinder.find_path(source, destination, mesh, mode=mode)
+                    totals[mode][1] += time() - start
+                    totals[mode][0] += len(visited)
+                    lengths[mode] = path_length(path)
+                if lengths['classic'] and lengths['optimal']:
+                    totals['classic'][2] += lengths['classic']
+                    totals['optimal'][2] += lengths['optimal']
+                    shorter += lengths['optimal'] < lengths['classic'] - 1e-9
+
+        print("%-40s %12.1f %12.1f %12.3f %12.3f %9.3fx %9.1f%%" % (
+            filename, totals['classic'][0] / queries, totals['optimal'][0] / queries,
+            1e3 * totals['classic'][1] / queries, 1e3 * totals['optimal'][1] / queries,
+            totals['optimal'][2] / max(totals['classic'][2], 1e-9), 100 * shorter / queries))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmarks for the navmesh tools.")
+    parser.add_argument('--queries', type=int, default=2000, help="number of queries per mesh")
+    parser.add_argument('--seed', type=int, default=0)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    locate_parser = subparsers.add_parser('locate', help="point-to-box lookup with and without the box index")
+    locate_parser.add_argument('meshes', nargs='+')
+
+    engine_parser = subparsers.add_parser('engine', help="query throughput of find_path and PathQueryEngine")
+    engine_parser.add_argument('meshes', nargs='+')
+    engine_parser.add_argument('--processes', type=int, default=1, help="also time a process pool of this size")
+
+    build_parser = subparsers.add_parser('build',
+                                         help="mesh building with build_mesh, build_mesh_fast and build_mesh_tiled")
+    build_parser.add_argument('images', nargs='+')
+    build_parser.add_argument('--min-feature-size', type=int, default=16)
+    build_parser.add_argument('--scale', type=int, default=1, help="enlarge each image by this factor first")
+    build_parser.add_argument('--workers', type=int, default=1, help="processes used by build_mesh_tiled")
+    build_parser.add_argument('--tile-size', type=int, default=512)
+
+    load_parser = subparsers.add_parser('load', help="cold-start cost of pickled and memory-mapped meshes")
+    load_parser.add_argument('meshes', nargs='+', help="pickled meshes; each is also converted to .mesh.bin")
+
+    hierarchy_parser = subparsers.add_parser('hierarchy', help="expanded boxes and latency of find_path and HPA*")
+    hierarchy_parser.add_argument('meshes', nargs='+')
+    hierarchy_parser.add_argument('--region-size', type=int, default=64)
+
+    cache_parser = subparsers.add_parser('cache', help="find_path with and without the LRU corridor cache")
+    cache_parser.add_argument('meshes', nargs='+')
+    cache_parser.add_argument('--hotspots', type=int, default=20, help="number of boxes the queries go between")
+    cache_parser.add_argument('--capacity', type=int, default=256)
+
+    funnel_parser = subparsers.add_parser('funnel', help="per-query cost and effect of string-pulling paths")
+    funnel_parser.add_argument('meshes', nargs='+')
+
+    update_parser = subparsers.add_parser('update', help="incremental mesh updates against full rebuilds")
+    update_parser.add_argument('images', nargs='+')
+    update_parser.add_argument('--min-feature-size', type=int, default=16)
+    update_parser.add_argument('--edits', type=int, default=50)
+
+    bidirectional_parser = subparsers.add_parser('bidirectional', help="classic and optimal find_path modes")
+    bidirectional_parser.add_argument('meshes', nargs='+')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'locate':
+        bench_locate(args.meshes, args.queries, args.seed)
+    elif args.benchmark == 'engine':
+        bench_engine(args.meshes, args.queries, args.seed, args.processes)
+    elif args.benchmark == 'build':
+        bench_build(args.images, args.min_feature_size, args.scale, args.workers, args.tile_size)
+    elif args.benchmark == 'load':
+        bench_load(args.meshes, args.queries, args.seed)
+    elif args.benchmark == 'hierarchy':
+        bench_hierarchy(args.meshes, args.queries, args.seed, args.region_size)
+    elif args.benchmark == 'cache':
+        bench_cache(args.meshes, args.queries, args.seed, args.hotspots, args.capacity)
+    elif args.benchmark == 'funnel':
+        bench_funnel(args.meshes, args.queries, args.seed)
+    elif args.benchmark == 'update':
+        bench_update(args.images, args.min_feature_size, args.edits, args.seed)
+    elif args.benchmark == 'bidirectional':
+        bench_bidirectional(args.meshes, args.queries, args.seed)
@@ -0,0 +1,140 @@
+import pickle
+import sys
+from math import ceil
+
+
+def build_box_index(boxes, cell_size=None):
+    """
+    Builds a uniform grid bucket index so that the box containing a point can be found without scanning every box.
+
+    Args:
+        boxes: an iterable of rectangular regions defined by their bounds (x1, x2, y1, y2).
+        cell_size: the side length of a grid cell in pixels. When omitted, it is derived from the average box size.
+
+    Returns:
+        A dictionary containing:
+            - 'cell_size': the side length of a grid cell.
+            - 'cells': a dictionary mapping (cell_x, cell_y) to the list of boxes overlapping that cell.
+    """
+    boxes = list(boxes)
+
+    if cell_size is None:
+        # Cells roughly the size of an average box keep every bucket down to a handful of boxes.
+        if boxes:
+            total = sum((x2 - x1) + (y2 - y1) for x1, x2, y1, y2 in boxes)
+            cell_size = max(1, int(total / (2 * len(boxes))))
+        else:
+            cell_size = 1
+
+    index = {'cell_size': cell_size, 'cells': {}}
+    for box in boxes:
+        index_add_box(index, box)
+
+    return index
+
+
+def _box_cells(index, box):
+    """Yields the grid cells overlapped by the given box."""
+    size = index['cell_size']
+    x1, x2, y1, y2 = box
+    # Boxes are half-open, so the last cell a box reaches is the one holding points just below x2 and y2.
+    for cx in range(int(x1 // size), int(ceil(x2 / size))):
+        for cy in range(int(y1 // size), int(ceil(y2 / size))):
+            yield cx, cy
+
+
+def index_add_box(index, box):
+    """Adds a box to every bucket of the index that it overlaps."""
+    cells = index['cells']
+    for cell in _box_cells(index, box):
+        if cell in cells:
+            cells[cell].append(box)
+        else:
+            cells[cell] = [box]
+
+
+def index_remove_box(index, box):
+    """Removes a box from every bucket of the index that it overlaps."""
+    cells = index['cells']
+    for cell in _box_cells(index, box):
+        bucket = cells.get(cell)
+        if bucket is None:
+            continue
+        try:
+            bucket.remove(box)
+        except ValueError:
+            continue
+        if not bucket:
+            del cells[cell]
+
+
+def locate(index, point):
+    """
+    Finds the box containing the given point using the grid index.
+
+    Args:
+        index: an index produced by build_box_index.
+        point: an (x, y) tuple.
+
+    Returns:
+        The box containing the point, or None if the point is outside all boxes.
+    """
+    size = index['cell_size']
+    x, y = point
+    for box in index['cells'].get((int(x // size), int(y // size)), ()):
+        x1, x2, y1, y2 = box
+        if x1 <= x < x2 and y1 <= y < y2:
+            return box
+    return None
+
+
+def overlapping(index, rect):
+    """
+    Finds the boxes of the index that overlap a rectangle.
+
+    Args:
+        index: an index produced by build_box_index.
+        rect: the (x1, x2, y1, y2) bounds of the rectangle.
+
+    Returns:
+        The set of boxes sharing some area with the rectangle.
+    """
+    x1, x2, y1, y2 = rect
+    cells = index['cells']
+    found = set()
+    for cell in _box_cells(index, rect):
+        for box in cells.get(cell, ()):
+            if box[0] < x2 and x1 < box[1] and box[2] < y2 and y1 < box[3]:
+                found.add(box)
+    return found
+
+
+def get_box_index(mesh):
+    """
+    Returns the box index stored with the mesh, building and attaching it first if the mesh does not have one yet
+    (e.g. meshes pickled before the index existed).
+    """
+    index = mesh.get('index')
+    if index is None:
+        index = build_box_index(mesh['boxes'])
+        mesh['index'] = index
+    return index
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print("usage: %s map.mesh.pickle [map.mesh.pickle ...]" % sys.argv[0])
+        print("Adds a point-location index to existing mesh pickles.")
+        sys.exit(-1)
+
+    for filename in sys.argv[1:]:
+        with open(filename, 'rb') as f:
+            mesh = pickle.load(f)
+
+        mesh['index'] = build_box_index(mesh['boxes'])
+
+        with open(filename, 'wb') as f:
+            pickle.dump(mesh, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        print("Indexed %d boxes into %d cells in %s." % (len(mesh['boxes']), len(mesh['index']['cells']), filename))
@@ -0,0 +1,164 @@
+import pickle
+import sys
+
+import nm_pathfinder
+from nm_meshfile import ArrayMesh, portal
+
+
+def _cross(origin, a, b):
+    """Positive when b lies to the left of the line from origin through a, negative to the right, zero on it."""
+    return (a[0] - origin[0]) * (b[1] - origin[1]) - (a[1] - origin[1]) * (b[0] - origin[0])
+
+
+def link_portal(a, b, shared=None):
+    """
+    Returns the portal crossed when walking from box a into the adjacent box b, as a (left, right) pair of points.
+
+    The portal lies on the boundary between the boxes, and is a single point when they only touch at a corner. Like
+    the points of find_path, its ends stay on the last row or column of pixels of the narrower box.
+
+    Args:
+        shared: the rectangle nm_meshfile.portal(a, b) of the link, when it is already known.
+    """
+    x1, x2, y1, y2 = portal(a, b) if shared is None else shared
+    # The rectangle has zero size along an axis where the boxes only meet; elsewhere it ends one pixel further.
+    x_meet, y_meet = x1 == x2, y1 == y2
+    if not x_meet:
+        x2 -= 1
+    if not y_meet:
+        y2 -= 1
+    if x_meet and y_meet:
+        return (x1, y1), (x1, y1)
+    if x_meet:
+        # Walking along x: when x increases, the left is toward larger y.
+        return ((x1, y2), (x1, y1)) if b[0] >= a[1] else ((x1, y1), (x1, y2))
+    if y_meet:
+        # Walking along y: when y increases, the left is toward smaller x.
+        return ((x1, y1), (x2, y1)) if b[2] >= a[3] else ((x2, y1), (x1, y1))
+    # Overlapping boxes: the middle of the overlap will do.
+    middle = ((x1 + x2) // 2, (y1 + y2) // 2)
+    return middle, middle
+
+
+def build_portals(mesh):
+    """
+    Computes the portal of every link of the mesh, in both directions.
+
+    Returns:
+        A dictionary mapping each (box, neighbor box) pair to the (left, right) points of its portal.
+    """
+    if isinstance(mesh, ArrayMesh):
+        # Binary mesh files already store the rectangle of every link.
+        boxes = mesh['boxes']
+        offsets, neighbors, shared = mesh.offsets.tolist(), mesh.neighbors.tolist(), mesh.portals.tolist()
+        return {(a, boxes[neighbors[k]]): link_portal(a, boxes[neighbors[k]], shared[k])
+                for i, a in enumerate(boxes) for k in range(offsets[i], offsets[i + 1])}
+    adj = mesh['adj']
+    return {(a, b): link_portal(a, b) for a in adj for b in adj[a]}
+
+
+def get_portals(mesh):
+    """
+    Returns the portals stored with the mesh, computing and attaching them first if the mesh does not have them, or
+    if they were computed for an older mesh['version'].
+    """
+    portals = mesh.get('portals')
+    if portals is None or portals['version'] != mesh.get('version'):
+        portals = {'version': mesh.get('version'), 'links': build_portals(mesh)}
+        mesh['portals'] = portals
+    return portals['links']
+
+
+def string_pull(source_point, destination_point, corridor, portals):
+    """
+    Shortens a path through a corridor of boxes with the funnel algorithm.
+
+    The funnel is the wedge from the last waypoint (the apex) through the left and right ends of the portals crossed
+    so far. Each new portal narrows it; when a portal falls entirely to one side of the funnel, the end of the funnel
+    on that side is a corner the path has to turn around, and becomes the next waypoint.
+
+    Args:
+        source_point: the starting point, inside corridor[0].
+        destination_point: the goal point, inside corridor[-1].
+        corridor: the box sequence connecting the two points, as filled in by find_path.
+        portals: the portals of the mesh, from get_portals.
+
+    Returns:
+        The shortest path (list of points) through the corridor, with a waypoint at each turn only.
+    """
+    gates = [(source_point, source_point)]
+    gates.extend(portals[a, b] for a, b in zip(corridor, corridor[1:]))
+    gates.append((destination_point, destination_point))
+
+    path = [source_point]
+    apex = left = right = source_point
+    apex_index = left_index = right_index = 0
+
+    i = 1
+    while i < len(gates):
+        next_left, next_right = gates[i]
+
+        # Narrow the funnel from the right.
+        if _cross(apex, right, next_right) >= 0:
+            if apex == right or _cross(apex, left, next_right) < 0:
+                right, right_index = next_right, i
+            else:
+                # The right side crossed over the left one: the path turns around the left end.
+                path.append(left)
+                apex, apex_index = left, left_index
+                right, right_index = apex, apex_index
+                i = apex_index + 1
+                continue
+
+        # Narrow the funnel from the left.
+        if _cross(apex, left, next_left) <= 0:
+            if apex == left or _cross(apex, right, next_left) > 0:
+                left, left_index = next_left, i
+            else:
+                path.append(right)
+                apex, apex_index = right, right_index
+                left, left_index = apex, apex_index
+                i = apex_index + 1
+                continue
+
+        i += 1
+
+    if path[-1] != destination_point:
+        path.append(destination_point)
+    return path
+
+
+def find_smooth_path(source_point, destination_point, mesh, mode='classic'):
+    """
+    Searches for a path with nm_pathfinder.find_path and string-pulls it through the boxes it found.
+
+    Returns:
+        A path (list of points) from source_point to destination_point if it exists.
+        A list of boxes explored by the search.
+    """
+    corridor = []
+    path, visited = nm_pathfinder.find_path(source_point, destination_point, mesh, corridor, mode)
+    if not path:
+        return path, visited
+    return string_pull(source_point, destination_point, corridor, get_portals(mesh)), visited
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) != 2:
+        print("usage: %s map.mesh.pickle" % sys.argv[0])
+        print("Precomputes the portals of a pickled mesh for string-pulling.")
+        sys.exit(-1)
+
+    filename = sys.argv[1]
+    if filename.endswith('.bin'):
+        print("%s is a binary mesh; it already stores its portals." % filename)
+        sys.exit(-1)
+    with open(filename, 'rb') as f:
+        mesh = pickle.load(f)
+    get_portals(mesh)
+
+    with open(filename, 'wb') as f:
+        pickle.dump(mesh, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    print("Stored %d portals in %s." % (len(mesh['portals']['links']), filename))
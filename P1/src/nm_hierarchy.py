@@ -0,0 +1,252 @@
+import pickle
+import sys
+from heapq import heappop, heappush
+from math import sqrt
+
+from nm_box_index import get_box_index, locate
+from nm_meshfile import load_mesh
+from nm_pathfinder import corridor_points
+
+
+def center(box):
+    """Returns the center point of a box."""
+    x1, x2, y1, y2 = box
+    return (x1 + x2) / 2, (y1 + y2) / 2
+
+
+def center_distance(a, b):
+    """The cost of moving between two adjacent boxes in the hierarchy: the distance between their centers."""
+    (ax, ay), (bx, by) = center(a), center(b)
+    return sqrt((ax - bx)**2 + (ay - by)**2)
+
+
+def local_search(mesh, region_of, region, source_box, goal_box=None):
+    """
+    Searches the box graph without leaving one region.
+
+    With a goal_box, this is an A* search that stops once the goal is reached. Without one, it is a Dijkstra search
+    that computes the distance to every box of the region.
+
+    Returns:
+        A tuple (distances, prev, expanded) of the distance and predecessor tables and the number of boxes expanded.
+    """
+    distances = {source_box: 0}
+    prev = {source_box: None}
+    queue = [(0, 0, source_box)]
+    expanded = 0
+
+    while queue:
+        _, cost, current = heappop(queue)
+        if cost > distances[current]:
+            continue
+        if current == goal_box:
+            break
+        expanded += 1
+
+        for neighbor in mesh['adj'].get(current, []):
+            if region_of[neighbor] != region:
+                continue
+            next_cost = cost + center_distance(current, neighbor)
+            if neighbor not in distances or next_cost < distances[neighbor]:
+                distances[neighbor] = next_cost
+                prev[neighbor] = current
+                priority = next_cost
+                if goal_box is not None:
+                    priority += center_distance(neighbor, goal_box)
+                heappush(queue, (priority, next_cost, neighbor))
+
+    return distances, prev, expanded
+
+
+def _walk_back(prev, box):
+    boxes = []
+    while box is not None:
+        boxes.append(box)
+        box = prev[box]
+    boxes.reverse()
+    return boxes
+
+
+def build_hierarchy(mesh, region_size=64):
+    """
+    Precomputes an abstract graph over the mesh for long-distance queries.
+
+    Boxes are grouped into regions: the boxes whose centers fall in the same region_size x region_size square and
+    which are connected to each other inside that square. Boxes with a neighbor in another region are entrances.
+    The abstract graph links the entrances of each region by their shortest distance within the region, and links
+    entrances of different regions that touch.
+
+    Args:
+        mesh: a dictionary containing 'boxes' and 'adj' as produced by nm_meshbuilder.
+        region_size: the side length in pixels of the squares the regions are cut from.
+
+    Returns:
+        A dictionary containing:
+            - 'region_size': the region_size used.
+            - 'region': a dictionary mapping each box to its region id.
+            - 'entrances': a dictionary mapping each region id to its list of entrance boxes.
+            - 'abstract': a dictionary mapping each entrance box to a list of (entrance box, cost) edges.
+    """
+    adj = mesh['adj']
+
+    def square(box):
+        x, y = center(box)
+        return int(x // region_size), int(y // region_size)
+
+    # Split every square into connected regions.
+    region_of = {}
+    regions = 0
+    for box in mesh['boxes']:
+        if box in region_of:
+            continue
+        home = square(box)
+        region_of[box] = regions
+        stack = [box]
+        while stack:
+            current = stack.pop()
+            for neighbor in adj.get(current, []):
+                if neighbor not in region_of and square(neighbor) == home:
+                    region_of[neighbor] = regions
+                    stack.append(neighbor)
+        regions += 1
+
+    entrances = {region: [] for region in range(regions)}
+    abstract = {}
+    for box in mesh['boxes']:
+        links = [(neighbor, center_distance(box, neighbor))
+                 for neighbor in adj.get(box, []) if region_of[neighbor] != region_of[box]]
+        if links:
+            entrances[region_of[box]].append(box)
+            abstract[box] = links
+
+    # Connect the entrances of every region to each other.
+    for region, boxes in entrances.items():
+        for box in boxes:
+            distances, _, _ = local_search(mesh, region_of, region, box)
+            abstract[box].extend((other, distances[other]) for other in boxes
+                                 if other != box and other in distances)
+
+    return {'region_size': region_size, 'region': region_of, 'entrances': entrances, 'abstract': abstract}
+
+
+def find_path(source_point, destination_point, mesh, hierarchy, stats=None):
+    """
+    Searches for a path using the precomputed hierarchy: the abstract graph is searched first, and only the segments
+    of its solution that run inside a region are refined on the box graph.
+
+    Args:
+        source_point: starting point, as an (x, y) tuple.
+        destination_point: goal point, as an (x, y) tuple.
+        mesh: the mesh the hierarchy was built from.
+        hierarchy: the result of build_hierarchy.
+        stats: an optional dictionary that receives 'expanded' (boxes and abstract nodes expanded).
+
+    Returns:
+        A path (list of points) from source_point to destination_point, or an empty list if there is none.
+        A list of boxes explored by the refinement searches.
+    """
+    index = get_box_index(mesh)
+    start_box = locate(index, source_point)
+    end_box = locate(index, destination_point)
+    if stats is not None:
+        stats['expanded'] = 0
+    if not start_box or not end_box:
+        print("Source or destination point is not within any box!")
+        return [], []
+
+    region_of = hierarchy['region']
+    abstract = hierarchy['abstract']
+    start_region, end_region = region_of[start_box], region_of[end_box]
+    expanded = 0
+    visited = set()
+
+    if start_region == end_region:
+        distances, prev, expanded = local_search(mesh, region_of, start_region, start_box, end_box)
+        visited.update(distances)
+        if stats is not None:
+            stats['expanded'] = expanded
+        return corridor_points(source_point, destination_point, _walk_back(prev, end_box)), list(visited)
+
+    # Attach the endpoints to the entrances of their regions.
+    start_distances, start_prev, count = local_search(mesh, region_of, start_region, start_box)
+    expanded += count
+    end_distances, end_prev, count = local_search(mesh, region_of, end_region, end_box)
+    expanded += count
+    visited.update(start_distances)
+    visited.update(end_distances)
+
+    # A* over the abstract graph. The endpoints take part as extra nodes: start links to its region's entrances,
+    # and the entrances of the end region link to end.
+    goal_links = {box: end_distances[box] for box in hierarchy['entrances'][end_region] if box in end_distances}
+    distances = {start_box: 0}
+    prev = {start_box: None}
+    queue = [(center_distance(start_box, end_box), 0, start_box)]
+    found = False
+
+    while queue:
+        _, cost, current = heappop(queue)
+        if cost > distances[current]:
+            continue
+        if current == end_box:
+            found = True
+            break
+        expanded += 1
+
+        edges = abstract.get(current, [])
+        if current == start_box:
+            edges = edges + [(box, start_distances[box]) for box in hierarchy['entrances'][start_region]
+                             if box in start_distances and box != start_box]
+        if current in goal_links:
+            edges = edges + [(end_box, goal_links[current])]
+
+        for neighbor, step in edges:
+            next_cost = cost + step
+            if neighbor not in distances or next_cost < distances[neighbor]:
+                distances[neighbor] = next_cost
+                prev[neighbor] = current
+                heappush(queue, (next_cost + center_distance(neighbor, end_box), next_cost, neighbor))
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    if not found:
+        print("No path found!")
+        return [], list(visited)
+
+    # Refine every abstract edge into boxes. Edges between regions are single steps, the legs from and to the
+    # endpoints come from the searches above, and the other edges inside a region are searched again locally.
+    waypoints = _walk_back(prev, end_box)
+    boxes = [start_box]
+    for a, b in zip(waypoints, waypoints[1:]):
+        if region_of[a] != region_of[b]:
+            boxes.append(b)
+        elif a == start_box:
+            boxes.extend(_walk_back(start_prev, b)[1:])
+        elif b == end_box:
+            boxes.extend(reversed(_walk_back(end_prev, a)[:-1]))
+        else:
+            local_distances, local_prev, count = local_search(mesh, region_of, region_of[a], a, b)
+            expanded += count
+            visited.update(local_distances)
+            boxes.extend(_walk_back(local_prev, b)[1:])
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    return corridor_points(source_point, destination_point, boxes), list(visited)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3):
+        print("usage: %s map.mesh.pickle [region_size]" % sys.argv[0])
+        sys.exit(-1)
+
+    filename = sys.argv[1]
+    region_size = int(sys.argv[2]) if len(sys.argv) == 3 else 64
+
+    mesh = load_mesh(filename)
+    hierarchy = build_hierarchy(mesh, region_size)
+
+    with open(filename + '.hpa.pickle', 'wb') as f:
+        pickle.dump(hierarchy, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    print("Built %d regions with %d entrances." % (len(hierarchy['entrances']), len(hierarchy['abstract'])))
@@ -0,0 +1,126 @@
+import argparse
+import pickle
+
+from matplotlib.pyplot import imread
+import numpy
+
+from nm_box_index import get_box_index, index_add_box, index_remove_box, overlapping
+from nm_meshbuilder import scan_boxes
+
+# The smallest min_feature_size the recursive scan can use: below it, boxes of 2 pixels get cut into themselves.
+FINE_FEATURE_SIZE = 5
+
+
+def touching(a, b):
+    """Tells whether two boxes share a side, a corner or some area."""
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+
+def update_mesh(mesh, image, rect, min_feature_size=16):
+    """
+    Rebuilds the part of a mesh covering a changed rectangle of its map, in place.
+
+    The boxes overlapping the rectangle are removed and each of them is scanned again from the new image. The
+    walkable pixels near the rectangle that were not covered by any box are scanned too. The new boxes, and the kept
+    boxes that lost a neighbor, are then connected to every box they touch. mesh['boxes'], mesh['adj'] and the box
+    index are patched rather than replaced, and mesh['version'] is incremented so that caches such as
+    nm_path_cache.PathCache notice the change.
+
+    Unlike nm_meshbuilder, boxes left without any neighbor are kept (with an empty adjacency list), so that a later
+    edit, e.g. opening a door again, can reconnect them.
+
+    Args:
+        mesh: a dictionary containing 'boxes' and 'adj' as produced by nm_meshbuilder.
+        image: the whole map after the change, as a 2D array where 255 is walkable and 0 is blocked.
+        rect: the (x1, x2, y1, y2) bounds of the pixels that changed.
+        min_feature_size: the value the mesh was built with.
+
+    Returns:
+        The (x1, x2, y1, y2) bounds of the rectangle and of the boxes that were replaced.
+    """
+    index = get_box_index(mesh)
+    adj = mesh['adj']
+
+    x1, x2, y1, y2 = rect
+    rect = (max(x1, 0), min(x2, image.shape[0]), max(y1, 0), min(y2, image.shape[1]))
+    removed = overlapping(index, rect)
+
+    # The kept boxes that lose a neighbor are linked again below, with the new boxes.
+    relink = set()
+    for box in removed:
+        for neighbor in adj.pop(box, []):
+            if neighbor not in removed:
+                adj[neighbor].remove(box)
+                relink.add(neighbor)
+        index_remove_box(index, box)
+
+    # Every removed box is scanned again on its own. Meshes can hold boxes lying inside bigger ones, which are
+    # covered by scanning the bigger box.
+    scans = [box for box in removed
+             if not any(other != box and other[0] <= box[0] and box[1] <= other[1] and other[2] <= box[2]
+                        and box[3] <= other[3] for other in removed)]
+
+    # The walkable pixels around the rectangle that no old box covered, e.g. narrow gaps that were too small to keep
+    # next to the old walls, may now be part of a bigger open space. They are scanned with the old boxes masked out,
+    # and split as finely as needed so that the mask does not cut passages.
+    x1, x2, y1, y2 = rect
+    x1, x2 = max(x1 - min_feature_size, 0), min(x2 + min_feature_size, image.shape[0])
+    y1, y2 = max(y1 - min_feature_size, 0), min(y2 + min_feature_size, image.shape[1])
+    around = (x1, x2, y1, y2)
+    patch = image[x1:x2, y1:y2].copy()
+    for bx1, bx2, by1, by2 in overlapping(index, around) | removed:
+        patch[max(bx1 - x1, 0):bx2 - x1, max(by1 - y1, 0):by2 - y1] = 0
+
+    added = []
+    tiles = [(around, patch, FINE_FEATURE_SIZE)]
+    tiles.extend((box, image[box[0]:box[1], box[2]:box[3]], min_feature_size) for box in scans)
+    for (x1, x2, y1, y2), tile, feature_size in tiles:
+        boxes, _ = scan_boxes(tile, feature_size)
+        added.extend((bx1 + x1, bx2 + x1, by1 + y1, by2 + y1) for bx1, bx2, by1, by2 in boxes
+                     if bx1 < bx2 and by1 < by2)
+
+    # The new boxes are connected to every box they touch, old or new, by looking them up in the index rather than
+    # by following the cuts of the scan, which no longer line up with the boxes around the region.
+    for box in added:
+        adj[box] = []
+        index_add_box(index, box)
+    relink.update(added)
+    for box in relink:
+        bx1, bx2, by1, by2 = box
+        for neighbor in overlapping(index, (bx1 - 1, bx2 + 1, by1 - 1, by2 + 1)):
+            if neighbor != box and touching(box, neighbor) and box not in adj[neighbor]:
+                adj[box].append(neighbor)
+                adj[neighbor].append(box)
+
+    mesh['boxes'][:] = [box for box in mesh['boxes'] if box not in removed]
+    mesh['boxes'].extend(added)
+    mesh['version'] = mesh.get('version', 0) + 1
+
+    x1, x2, y1, y2 = rect
+    return (min([x1] + [b[0] for b in removed]), max([x2] + [b[1] for b in removed]),
+            min([y1] + [b[2] for b in removed]), max([y2] + [b[3] for b in removed]))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Updates a mesh pickle after part of its map image was edited.")
+    parser.add_argument('map_filename', help="the edited map image")
+    parser.add_argument('mesh_filename', help="the mesh pickle built from the map before the edit")
+    parser.add_argument('rect', type=int, nargs=4, metavar=('X1', 'X2', 'Y1', 'Y2'),
+                        help="bounds of the edited pixels (x is the row)")
+    parser.add_argument('--min-feature-size', type=int, default=16)
+    args = parser.parse_args()
+
+    img = (imread(args.map_filename) * 255).astype(dtype=numpy.uint8)
+    if len(img.shape) > 2:
+        img = img[:, :, 0]
+
+    with open(args.mesh_filename, 'rb') as f:
+        mesh = pickle.load(f)
+
+    region = update_mesh(mesh, img, tuple(args.rect), args.min_feature_size)
+
+    with open(args.mesh_filename, 'wb') as f:
+        pickle.dump(mesh, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    print("Rebuilt region %s; the mesh now has %d boxes." % (region, len(mesh['boxes'])))
@@ -1,12 +1,16 @@
+import argparse
 import collections
 import pickle
-import sys
 import random
+from multiprocessing import Pool
 
 from matplotlib.pyplot import imread, imsave
 import numpy
 from numpy import zeros_like
 
+from nm_box_index import build_box_index
+from nm_meshfile import save_mesh_file
+
 
 def build_mesh(image, min_feature_size):
     def scan(box):
@@ -115,6 +119,11 @@ def build_mesh(image, min_feature_size):
 
     boxes, edges = scan((0, image.shape[0], 0, image.shape[1]))
 
+    return mesh_from_edges(edges)
+
+
+def mesh_from_edges(edges):
+    """Builds the mesh dictionary from a list of box pairs. Boxes without any neighbor are left out."""
     adj = collections.defaultdict(list)
     for a, b in edges:
         adj[a].append(b)
@@ -125,25 +134,257 @@ def build_mesh(image, min_feature_size):
     return mesh
 
 
-if __name__ == '__main__':
+def summed_area_table(mask):
+    """Returns the (h+1) x (w+1) integral image of a boolean mask, so that the number of set pixels in
+    mask[x1:x2, y1:y2] is table[x2, y2] - table[x1, y2] - table[x2, y1] + table[x1, y1]."""
+    table = numpy.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=numpy.int64)
+    numpy.cumsum(numpy.cumsum(mask, axis=0, dtype=numpy.int64), axis=1, out=table[1:, 1:])
+    return table
+
+
+def split_box(box):
+    """
+    Splits a box in two halves on its longest dimension, the way build_mesh does.
+
+    Returns:
+        The first and second halves, the coordinate of the cut, the positions in a box tuple of its extent along the
+        cut (2, 3 for a cut at a fixed x), and the positions of the side lying on the cut in a first and in a second
+        half's box.
+    """
+    x1, x2, y1, y2 = box
+    if x2 - x1 > y2 - y1:
+        cut = int(x1 + (x2 - x1) / 2 + 1)
+        return (x1, cut, y1, y2), (cut, x2, y1, y2), (cut, 2, 3, 1, 0)
+    cut = int(y1 + (y2 - y1) / 2 + 1)
+    return (x1, x2, y1, cut), (x1, x2, cut, y2), (cut, 0, 1, 3, 2)
+
+
+def merge_halves(first, second, split):
+    """
+    Merges the scans of the two halves of a box, joining the boxes that match exactly across the cut and connecting
+    the ones that touch with a two-pointer sweep.
+
+    Args:
+        first, second: the (boxes, edges) of the two halves.
+        split: the cut, as returned by split_box.
+
+    Returns:
+        The boxes and edges of the whole box.
+    """
+    first_boxes, first_edges = first
+    second_boxes, second_edges = second
+    cut, lo, hi, first_side, second_side = split
+
+    # Nothing can be merged or connected across the cut when one side has no boxes.
+    if not second_boxes:
+        return first_boxes, first_edges
+    if not first_boxes:
+        return second_boxes, second_edges
+
+    my_boxes = [fb for fb in first_boxes if fb[first_side] != cut]
+    my_boxes.extend(sb for sb in second_boxes if sb[second_side] != cut)
+    my_edges = []
+
+    def rank(b): return (b[lo], b[hi])
+
+    first_touches = sorted((fb for fb in first_boxes if fb[first_side] == cut), key=rank)
+    second_touches = sorted((sb for sb in second_boxes if sb[second_side] == cut), key=rank)
+
+    first_merges = {}
+    second_merges = {}
+
+    i, j = 0, 0
+    while i < len(first_touches) and j < len(second_touches):
+
+        f, s = first_touches[i], second_touches[j]
+        rf, rs = rank(f), rank(s)
+
+        if rf == rs:
+            i += 1
+            j += 1
+            merged = (f[0], s[1], f[2], s[3])
+            first_merges[f] = merged
+            second_merges[s] = merged
+            my_boxes.append(merged)
+
+        elif rf[1] < rs[1]:
+            i += 1
+            my_boxes.append(f)
+            if rf[1] >= rs[0]:
+                my_edges.append((f, s))
+
+        elif rf[1] > rs[1]:
+            j += 1
+            my_boxes.append(s)
+            if rf[0] <= rs[1]:
+                my_edges.append((f, s))
+
+        else:
+            i += 1
+            j += 1
+            my_boxes.append(f)
+            my_boxes.append(s)
+            my_edges.append((f, s))
+
+    my_boxes.extend(first_touches[i:])
+    my_boxes.extend(second_touches[j:])
+
+    for a, b in first_edges:
+        my_edges.append((first_merges.get(a, a), first_merges.get(b, b)))
+
+    for a, b in second_edges:
+        my_edges.append((second_merges.get(a, a), second_merges.get(b, b)))
+
+    return my_boxes, my_edges
+
+
+def box_leaf_test(image, min_feature_size):
+    """
+    Returns a function answering, in constant time with summed-area tables, whether build_mesh stops splitting a
+    box: it gives the (boxes, edges) of the box when it is all white, all black or too small to split, and None
+    otherwise.
+    """
+    white = summed_area_table(image == 255).item
+    black = summed_area_table(image == 0).item
+
+    def leaf(box):
+        x1, x2, y1, y2 = box
+        area = (x2 - x1) * (y2 - y1)
+
+        if white(x2, y2) - white(x1, y2) - white(x2, y1) + white(x1, y1) == area:
+            return [box], []
+        if area < min_feature_size or black(x2, y2) - black(x1, y2) - black(x2, y1) + black(x1, y1) == area:
+            return [], []
+        return None
+
+    return leaf
+
+
+def scan_boxes(image, min_feature_size, root=None):
+    """
+    Splits the image into boxes exactly like build_mesh, but answers the "all white" and "all black" tests with
+    summed-area tables in constant time per box, and merges the boxes touching each cut with a two-pointer sweep
+    instead of popping from the front of lists.
+
+    Args:
+        image: a 2D array of pixel values where 255 is walkable and 0 is blocked.
+        min_feature_size: boxes with a smaller area are not split any further.
+        root: the (x1, x2, y1, y2) box to scan, the whole image by default.
+
+    Returns:
+        The list of walkable boxes and the list of (box, box) pairs that touch.
+    """
+    leaf = box_leaf_test(image, min_feature_size)
+
+    def scan(box):
+        result = leaf(box)
+        if result is not None:
+            return result
+
+        # recursively split this big box on the longest dimension
+        first_box, second_box, split = split_box(box)
+        return merge_halves(scan(first_box), scan(second_box), split)
+
+    if root is None:
+        root = (0, image.shape[0], 0, image.shape[1])
 
-    min_feature_size = 16
-    filename = None
+    return scan(root)
 
-    if len(sys.argv) == 2:
-        filename = sys.argv[1]
-    elif len(sys.argv) == 3:
-        filename = sys.argv[1]
-        min_feature_size = int(sys.argv[2])
+
+def build_mesh_fast(image, min_feature_size):
+    """Builds the same mesh as build_mesh using summed-area tables; see scan_boxes."""
+    boxes, edges = scan_boxes(image, min_feature_size)
+    return mesh_from_edges(edges)
+
+
+def _scan_subtree(task):
+    """Scans one subtree of the recursion in a worker process, in whole-image coordinates."""
+    tile, min_feature_size, x0, y0 = task
+    # The cuts only depend on the offsets from the corner of a box, so scanning the pixels of the box on their own
+    # splits it exactly like scan_boxes(image, min_feature_size, root=box) would.
+    boxes, edges = scan_boxes(tile, min_feature_size)
+
+    def shift(b): return (b[0] + x0, b[1] + x0, b[2] + y0, b[3] + y0)
+
+    return [shift(b) for b in boxes], [(shift(a), shift(b)) for a, b in edges]
+
+
+def build_mesh_tiled(image, min_feature_size, tile_size=512, workers=1):
+    """
+    Builds the same mesh as build_mesh_fast with the deep part of the scan spread over a pool of worker processes.
+
+    The top of the recursion is followed serially until the boxes fit in tile_size x tile_size; the subtrees below
+    those boxes are scanned in the workers, and their results are merged back up the recursion across the same
+    cuts as a single scan, so the boxes and edges are exactly those of build_mesh_fast.
+
+    Args:
+        image: a 2D array of pixel values where 255 is walkable and 0 is blocked.
+        min_feature_size: boxes with a smaller area are not split any further.
+        tile_size: the largest side length of a box handed to a worker.
+        workers: the number of processes scanning subtrees.
+
+    Returns:
+        The mesh dictionary, as from build_mesh.
+    """
+    leaf = box_leaf_test(image, min_feature_size)
+    tasks = []
+
+    def plan(box):
+        # Returns the scan of box when it is a leaf, the index of its task when a worker scans it, or the plans of
+        # its halves and the cut between them.
+        result = leaf(box)
+        if result is not None:
+            return result
+        x1, x2, y1, y2 = box
+        if x2 - x1 <= tile_size and y2 - y1 <= tile_size:
+            tasks.append((image[x1:x2, y1:y2], min_feature_size, x1, y1))
+            return len(tasks) - 1
+        first_box, second_box, split = split_box(box)
+        return plan(first_box), plan(second_box), split
+
+    root = plan((0, image.shape[0], 0, image.shape[1]))
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.map(_scan_subtree, tasks)
     else:
-        print("usage: %s map_filename min_feature_size" % sys.argv[0])
-        sys.exit(-1)
+        results = [_scan_subtree(task) for task in tasks]
+
+    def merge(node):
+        if isinstance(node, int):
+            return results[node]
+        if len(node) == 2:
+            return node
+        first, second, split = node
+        return merge_halves(merge(first), merge(second), split)
+
+    boxes, edges = merge(root)
+
+    return mesh_from_edges(edges)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Builds a navigation mesh from a map image.")
+    parser.add_argument('map_filename')
+    parser.add_argument('min_feature_size', type=int, nargs='?', default=16)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="build the mesh in tiles on this many processes")
+    parser.add_argument('--tile-size', type=int, default=512, help="side length of a tile when using workers")
+    args = parser.parse_args()
+
+    filename = args.map_filename
+    min_feature_size = args.min_feature_size
 
     img = (imread(filename) * 255).astype(dtype=numpy.uint8)
     if len(img.shape) > 2:
         img = img[:, :, 0]
 
-    mesh = build_mesh(img, min_feature_size)
+    if args.workers > 1:
+        mesh = build_mesh_tiled(img, min_feature_size, args.tile_size, args.workers)
+    else:
+        mesh = build_mesh_fast(img, min_feature_size)
+    mesh['index'] = build_box_index(mesh['boxes'])
 
     print(type(mesh))
     print(mesh.keys())
@@ -151,6 +392,8 @@ if __name__ == '__main__':
     with open(filename + '.mesh.pickle', 'wb') as f:
         pickle.dump(mesh, f, protocol=pickle.HIGHEST_PROTOCOL)
 
+    save_mesh_file(mesh, filename + '.mesh.bin')
+
     atlas = zeros_like(img)
     for x1, x2, y1, y2 in mesh['boxes']:
         atlas[x1:x2, y1:y2] = random.randint(64, 255)
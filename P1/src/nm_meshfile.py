@@ -0,0 +1,244 @@
+import pickle
+import sys
+from collections.abc import Mapping
+
+import numpy
+
+from nm_box_index import build_box_index
+
+# Layout of a .mesh.bin file. Every section starts on an 8 byte boundary.
+#
+#   magic           8 bytes         b'NAVMESH1'
+#   header          8 x int64       N boxes, M adjacency links, box dtype code,
+#                                   index cell size, index columns X, index rows Y, K index entries, reserved
+#   boxes           N x 4           (x1, x2, y1, y2) of every box
+#   offsets         N+1 int64       the neighbors of box i are neighbors[offsets[i]:offsets[i + 1]]
+#   neighbors       M int32         box indices
+#   portals         M x 4           (x1, x2, y1, y2) of the shared edge of each link; one side has zero length
+#   cell offsets    X*Y+1 int64     the boxes in index cell (cx, cy) are cell_boxes[cell_offsets[cx * Y + cy]:...]
+#   cell boxes      K int32         box indices
+#
+# Boxes and portals are int32, unless some box coordinate is fractional, in which case they are float64.
+# The cells are those of the box index from nm_box_index, so point location needs no preprocessing after loading.
+MAGIC = b'NAVMESH1'
+BOX_DTYPES = {0: numpy.int32, 1: numpy.float64}
+HEADER_SIZE = len(MAGIC) + 8 * 8
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+def _layout(n_boxes, n_links, box_dtype, n_cells, n_entries):
+    """Returns the byte offset of every section of the file, followed by the file size."""
+    box_size = numpy.dtype(box_dtype).itemsize
+    boxes = HEADER_SIZE
+    offsets = _align(boxes + 4 * box_size * n_boxes)
+    neighbors = offsets + 8 * (n_boxes + 1)
+    portals = _align(neighbors + 4 * n_links)
+    cell_offsets = _align(portals + 4 * box_size * n_links)
+    cell_boxes = cell_offsets + 8 * (n_cells + 1)
+    end = cell_boxes + 4 * n_entries
+    return boxes, offsets, neighbors, portals, cell_offsets, cell_boxes, end
+
+
+def portal(a, b):
+    """Returns the rectangle shared by two touching boxes as (x1, x2, y1, y2); it has zero width along the axis
+    where the boxes meet, and is a single point when they only touch at a corner."""
+    return max(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])
+
+
+def save_mesh_file(mesh, filename):
+    """
+    Writes a mesh to the binary .mesh.bin format.
+
+    Args:
+        mesh: a dictionary containing 'boxes' and 'adj' as produced by nm_meshbuilder.
+        filename: the file to write.
+    """
+    boxes = list(mesh['boxes'])
+    box_ids = {box: i for i, box in enumerate(boxes)}
+    adj = mesh['adj']
+
+    offsets = [0]
+    neighbors = []
+    portals = []
+    for box in boxes:
+        for neighbor in adj.get(box, []):
+            neighbors.append(box_ids[neighbor])
+            portals.append(portal(box, neighbor))
+        offsets.append(len(neighbors))
+
+    index = mesh.get('index') or build_box_index(boxes)
+    cells = index['cells']
+    columns = 1 + max((cx for cx, cy in cells), default=-1)
+    rows = 1 + max((cy for cx, cy in cells), default=-1)
+    cell_offsets = [0]
+    cell_boxes = []
+    for cx in range(columns):
+        for cy in range(rows):
+            cell_boxes.extend(box_ids[box] for box in cells.get((cx, cy), ()))
+            cell_offsets.append(len(cell_boxes))
+
+    integral = all(float(v).is_integer() for box in boxes for v in box)
+    dtype_code = 0 if integral else 1
+    box_dtype = BOX_DTYPES[dtype_code]
+    layout = _layout(len(boxes), len(neighbors), box_dtype, columns * rows, len(cell_boxes))
+
+    data = bytearray(layout[-1])
+    data[:len(MAGIC)] = MAGIC
+    header = (len(boxes), len(neighbors), dtype_code, index['cell_size'], columns, rows, len(cell_boxes), 0)
+    sections = [
+        (header, '<i8', len(MAGIC)),
+        (numpy.asarray(boxes, dtype=box_dtype), box_dtype, layout[0]),
+        (offsets, numpy.int64, layout[1]),
+        (neighbors, numpy.int32, layout[2]),
+        (numpy.asarray(portals, dtype=box_dtype), box_dtype, layout[3]),
+        (cell_offsets, numpy.int64, layout[4]),
+        (cell_boxes, numpy.int32, layout[5]),
+    ]
+    for values, dtype, offset in sections:
+        values = numpy.asarray(values, dtype=dtype).reshape(-1)
+        numpy.frombuffer(data, dtype=dtype, count=len(values), offset=offset)[:] = values
+
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+
+class ArrayMesh(Mapping):
+    """
+    A mesh memory-mapped from a .mesh.bin file.
+
+    The arrays (boxes, offsets, neighbors, portals) are used directly by array-based consumers such as
+    PathQueryEngine. For code written against the pickled dictionary format, mesh['boxes'] and mesh['adj'] are
+    also available; they are only converted to Python objects the first time they are asked for.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            head = f.read(HEADER_SIZE)
+        if head[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a mesh file" % filename)
+        header = numpy.frombuffer(head, dtype='<i8', count=8, offset=len(MAGIC)).tolist()
+        n_boxes, n_links, dtype_code, self.cell_size, self.columns, self.rows, n_entries, _ = header
+        box_dtype = BOX_DTYPES[dtype_code]
+        layout = _layout(n_boxes, n_links, box_dtype, self.columns * self.rows, n_entries)
+
+        def view(dtype, offset, shape):
+            if not numpy.prod(shape):
+                return numpy.zeros(shape, dtype=dtype)  # numpy cannot memory-map an empty region.
+            return numpy.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+        self.boxes = view(box_dtype, layout[0], (n_boxes, 4))
+        self.offsets = view(numpy.int64, layout[1], (n_boxes + 1,))
+        self.neighbors = view(numpy.int32, layout[2], (n_links,))
+        self.portals = view(box_dtype, layout[3], (n_links, 4))
+        self.cell_offsets = view(numpy.int64, layout[4], (self.columns * self.rows + 1,))
+        self.cell_boxes = view(numpy.int32, layout[5], (n_entries,))
+        self._items = {}
+
+    def __getitem__(self, key):
+        if key not in self._items:
+            if key == 'boxes':
+                self._items['boxes'] = [tuple(box) for box in self.boxes.tolist()]
+            elif key == 'adj':
+                self._items['adj'] = CSRAdjacency(self)
+            elif key == 'index':
+                self._items['index'] = {'cell_size': self.cell_size, 'cells': CSRCells(self)}
+            else:
+                raise KeyError(key)
+        return self._items[key]
+
+    def __setitem__(self, key, value):
+        # Lets callers attach derived data such as the box index, like they would on a pickled mesh.
+        self._items[key] = value
+
+    def __iter__(self):
+        keys = ['boxes', 'adj', 'index']
+        keys.extend(key for key in self._items if key not in keys)
+        return iter(keys)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __reduce__(self):
+        # Worker processes reopen the file instead of receiving a copy of the arrays.
+        return ArrayMesh, (self.filename,)
+
+
+class CSRAdjacency(Mapping):
+    """A read-only view of an ArrayMesh's adjacency in the {box: [neighbor boxes]} form of mesh['adj']."""
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.box_ids = {box: i for i, box in enumerate(mesh['boxes'])}
+
+    def __getitem__(self, box):
+        i = self.box_ids[box]
+        boxes = self.mesh['boxes']
+        start, end = self.mesh.offsets[i], self.mesh.offsets[i + 1]
+        return [boxes[j] for j in self.mesh.neighbors[start:end].tolist()]
+
+    def __iter__(self):
+        return iter(self.box_ids)
+
+    def __len__(self):
+        return len(self.box_ids)
+
+
+class CSRCells(Mapping):
+    """A read-only view of an ArrayMesh's box index cells in the {(cx, cy): [boxes]} form used by nm_box_index."""
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    def __getitem__(self, cell):
+        cx, cy = cell
+        if not (0 <= cx < self.mesh.columns and 0 <= cy < self.mesh.rows):
+            raise KeyError(cell)
+        i = cx * self.mesh.rows + cy
+        start, end = self.mesh.cell_offsets[i], self.mesh.cell_offsets[i + 1]
+        if start == end:
+            raise KeyError(cell)
+        boxes = self.mesh['boxes']
+        return [boxes[j] for j in self.mesh.cell_boxes[start:end].tolist()]
+
+    def __iter__(self):
+        counts = numpy.diff(self.mesh.cell_offsets)
+        for i in numpy.flatnonzero(counts).tolist():
+            yield divmod(i, self.mesh.rows)
+
+    def __len__(self):
+        return int(numpy.count_nonzero(numpy.diff(self.mesh.cell_offsets)))
+
+
+def load_mesh(filename):
+    """Loads a mesh from either a .mesh.bin file (memory-mapped) or a pickle."""
+    if filename.endswith('.bin'):
+        return ArrayMesh(filename)
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3):
+        print("usage: %s map.mesh.pickle [map.mesh.bin]" % sys.argv[0])
+        print("Converts a pickled mesh to the memory-mapped binary format.")
+        sys.exit(-1)
+
+    source = sys.argv[1]
+    if len(sys.argv) == 3:
+        destination = sys.argv[2]
+    elif source.endswith('.pickle'):
+        destination = source[:-len('.pickle')] + '.bin'
+    else:
+        destination = source + '.bin'
+
+    with open(source, 'rb') as f:
+        mesh = pickle.load(f)
+
+    save_mesh_file(mesh, destination)
+
+    print("Wrote %d boxes to %s." % (len(mesh['boxes']), destination))
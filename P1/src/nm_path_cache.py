@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+import nm_pathfinder
+from nm_box_index import get_box_index, locate
+from nm_pathfinder import corridor_points
+
+
+class PathCache:
+    """
+    A memoizing layer in front of nm_pathfinder.find_path.
+
+    The box sequence (corridor) found between a start box and an end box is remembered, so a later query between
+    the same two boxes only recomputes the points of the path, from the exact source and destination points.
+    Queries in the opposite direction share the entry. Searches that find no path are not remembered. The least
+    recently used corridors are evicted once more than capacity are stored.
+
+    The cache empties itself when it is queried with a different mesh object, or when the mesh's 'version' entry
+    changes; code that edits a mesh in place should increment mesh['version'].
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._corridors = OrderedDict()
+        self._mesh = None
+        self._mesh_version = None
+
+    def clear(self):
+        """Forgets every stored corridor."""
+        self._corridors.clear()
+
+    def info(self):
+        """Returns the hit, miss and eviction counters and the current number of entries."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._corridors), 'capacity': self.capacity}
+
+    def find_path(self, source_point, destination_point, mesh):
+        """
+        Same interface as nm_pathfinder.find_path.
+
+        Returns:
+            A path (list of points) from source_point to destination_point if it exists.
+            A list of boxes explored by the search, which is empty when the corridor came from the cache.
+        """
+        version = mesh.get('version')
+        if mesh is not self._mesh or version != self._mesh_version:
+            self.clear()
+            self._mesh = mesh
+            self._mesh_version = version
+
+        index = get_box_index(mesh)
+        start_box = locate(index, source_point)
+        end_box = locate(index, destination_point)
+        if not start_box or not end_box:
+            print("Source or destination point is not within any box!")
+            return [], []
+
+        # Corridors are stored in one direction only, with the smaller box first.
+        reverse = end_box < start_box
+        key = (end_box, start_box) if reverse else (start_box, end_box)
+
+        corridor = self._corridors.get(key)
+        if corridor is not None:
+            self.hits += 1
+            self._corridors.move_to_end(key)
+            if reverse:
+                corridor = corridor[::-1]
+            return corridor_points(source_point, destination_point, corridor), []
+
+        self.misses += 1
+        corridor = []
+        path, visited = nm_pathfinder.find_path(source_point, destination_point, mesh, corridor)
+        if not path:
+            # Failures are not stored, so every one of them reports itself like a fresh search does.
+            return path, visited
+        path = corridor_points(source_point, destination_point, corridor)
+
+        self._corridors[key] = tuple(corridor[::-1] if reverse else corridor)
+        if len(self._corridors) > self.capacity:
+            self._corridors.popitem(last=False)
+            self.evictions += 1
+
+        return path, visited
@@ -1,11 +1,35 @@
 from heapq import heappop, heappush
 from math import sqrt
 
+from nm_box_index import get_box_index, locate
+
 def euclidean_distance(point1, point2):
     """Calculate the Euclidean distance between two points."""
     return sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
 
-def find_path(source_point, destination_point, mesh):
+def corridor_points(source_point, destination_point, boxes):
+    """
+    Builds a path through a sequence of adjacent boxes by clamping the previous point into each box in turn.
+
+    Args:
+        source_point: the starting point, inside boxes[0].
+        destination_point: the goal point, inside boxes[-1].
+        boxes: the box sequence (corridor) connecting the two points.
+
+    Returns:
+        A path (list of points) from source_point to destination_point.
+    """
+    path = [source_point]
+    point = source_point
+    for x1, x2, y1, y2 in boxes[1:]:
+        point = (min(max(point[0], x1), x2 - 1), min(max(point[1], y1), y2 - 1))
+        if point != path[-1]:
+            path.append(point)
+    if destination_point != path[-1]:
+        path.append(destination_point)
+    return path
+
+def find_path(source_point, destination_point, mesh, corridor=None, mode='classic', stats=None):
     """
     Searches for a path from source_point to destination_point through the mesh using bidirectional A* search.
 
@@ -15,18 +39,23 @@ def find_path(source_point, destination_point, mesh):
         mesh: a dictionary representing the navigable space, containing:
             - 'boxes': a list of rectangular regions (nodes) defined by their bounds (x1, x2, y1, y2).
             - 'adj': a dictionary mapping each box to a list of its adjacent boxes (edges in the graph).
+            - 'index' (optional): a point-location index over the boxes, built and attached on first use if missing.
+        corridor: an optional list that receives the sequence of boxes the path goes through.
+        mode: 'classic' stops as soon as the two searches touch; 'optimal' runs find_path_optimal instead.
+        stats: an optional dictionary that receives search counters (only filled in 'optimal' mode).
 
     Returns:
         A path (list of points) from source_point to destination_point if it exists.
         A list of boxes explored by the algorithm.
     """
+    if mode == 'optimal':
+        return find_path_optimal(source_point, destination_point, mesh, corridor, stats)
+
+    index = get_box_index(mesh)
+
     def find_box(point):
-        """Find the box that contains the given point by checking if the point's coordinates fall within any box's bounds."""
-        for box in mesh['boxes']:
-            x1, x2, y1, y2 = box
-            if x1 <= point[0] < x2 and y1 <= point[1] < y2:
-                return box
-        return None  # Return None if the point is outside all boxes.
+        """Find the box that contains the given point by looking up the grid cell of the mesh's box index."""
+        return locate(index, point)  # Returns None if the point is outside all boxes.
 
     # Identify the start and end boxes that contain the source and destination points.
     start_box = find_box(source_point)
@@ -139,4 +168,141 @@ def find_path(source_point, destination_point, mesh):
     # Combine the forward and backward paths to form a complete path from source to destination.
     path = reconstruct_path(forward_prev, backward_prev, meeting_box)
 
+    if corridor is not None:
+        box = meeting_box
+        while box:
+            corridor.append(box)
+            box = forward_prev[box][0]
+        corridor.reverse()
+        box = backward_prev[meeting_box][0]
+        while box:
+            corridor.append(box)
+            box = backward_prev[box][0]
+
+    return path, list(visited_boxes)
+
+
+def find_path_optimal(source_point, destination_point, mesh, corridor=None, stats=None):
+    """
+    Searches for a path with bidirectional A*, keeping the cost of the best path found through any box labeled by
+    both searches and stopping only once neither search can improve on it.
+
+    Both searches order their queues with the average of the two straight-line heuristics: a point p is keyed by
+    g + (|p - destination| - |p - source|) / 2 going forward and by g + (|p - source| - |p - destination|) / 2 going
+    backward. With these keys, no unexplored path can beat the best one found once the two smallest keys add up to at
+    least its cost. Heap entries that were superseded by a cheaper label are skipped when popped, and at each step the
+    direction with the smaller frontier is expanded.
+
+    Args:
+        source_point, destination_point, mesh, corridor: as for find_path.
+        stats: an optional dictionary that receives 'expanded_forward', 'expanded_backward', 'stale' (skipped heap
+            entries) and 'cost' (the length of the path found).
+
+    Returns:
+        A path (list of points) from source_point to destination_point if it exists.
+        A list of boxes explored by the algorithm.
+    """
+    index = get_box_index(mesh)
+    start_box = locate(index, source_point)
+    end_box = locate(index, destination_point)
+
+    if not start_box or not end_box:
+        print("Source or destination point is not within any box!")
+        return [], []
+
+    def potential(point, target, origin):
+        return (euclidean_distance(point, target) - euclidean_distance(point, origin)) / 2
+
+    # Each direction keeps its queue of (key, g, box), its distance table, and for every box the predecessor box
+    # and the point at which the path enters it.
+    forward = {'queue': [(potential(source_point, destination_point, source_point), 0, start_box)],
+               'distances': {start_box: 0}, 'prev': {start_box: (None, source_point)},
+               'target': destination_point, 'origin': source_point, 'expanded': 0}
+    backward = {'queue': [(potential(destination_point, source_point, destination_point), 0, end_box)],
+                'distances': {end_box: 0}, 'prev': {end_box: (None, destination_point)},
+                'target': source_point, 'origin': destination_point, 'expanded': 0}
+
+    best_cost = float('inf')  # The cost of the best complete path found so far.
+    meeting_box = None
+    stale = 0
+    visited_boxes = set()
+
+    def meet(box):
+        """Updates the best path with the one joining both searches inside box."""
+        nonlocal best_cost, meeting_box
+        if box in forward['distances'] and box in backward['distances']:
+            cost = (forward['distances'][box] + backward['distances'][box] +
+                    euclidean_distance(forward['prev'][box][1], backward['prev'][box][1]))
+            if cost < best_cost:
+                best_cost = cost
+                meeting_box = box
+
+    meet(start_box)
+
+    while forward['queue'] and backward['queue']:
+        if forward['queue'][0][0] + backward['queue'][0][0] >= best_cost:
+            break
+
+        search = forward if len(forward['queue']) <= len(backward['queue']) else backward
+        _, cost, current_box = heappop(search['queue'])
+        distances, prev = search['distances'], search['prev']
+        if cost > distances[current_box]:
+            stale += 1
+            continue
+
+        search['expanded'] += 1
+        visited_boxes.add(current_box)
+        current_point = prev[current_box][1]
+
+        for neighbor in mesh['adj'].get(current_box, []):
+            next_point = (
+                min(max(current_point[0], neighbor[0]), neighbor[1] - 1),
+                min(max(current_point[1], neighbor[2]), neighbor[3] - 1)
+            )
+            next_cost = cost + euclidean_distance(current_point, next_point)
+            if neighbor not in distances or next_cost < distances[neighbor]:
+                distances[neighbor] = next_cost
+                prev[neighbor] = (current_box, next_point)
+                key = next_cost + potential(next_point, search['target'], search['origin'])
+                heappush(search['queue'], (key, next_cost, neighbor))
+                meet(neighbor)
+
+    if stats is not None:
+        stats['expanded_forward'] = forward['expanded']
+        stats['expanded_backward'] = backward['expanded']
+        stats['stale'] = stale
+        stats['cost'] = best_cost
+
+    if meeting_box is None:
+        print("No path found!")
+        return [], list(visited_boxes)
+
+    # Walk from the meeting box back to the source, then forward to the destination.
+    points = []
+    box = meeting_box
+    while box:
+        box, point = forward['prev'][box]
+        points.append(point)
+    points.reverse()
+    box = meeting_box
+    while box:
+        box, point = backward['prev'][box]
+        points.append(point)
+
+    path = [points[0]]
+    for point in points[1:]:
+        if point != path[-1]:
+            path.append(point)
+
+    if corridor is not None:
+        box = meeting_box
+        while box:
+            corridor.append(box)
+            box = forward['prev'][box][0]
+        corridor.reverse()
+        box = backward['prev'][meeting_box][0]
+        while box:
+            corridor.append(box)
+            box = backward['prev'][box][0]
+
     return path, list(visited_boxes)
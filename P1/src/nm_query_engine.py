@@ -0,0 +1,210 @@
+from heapq import heappop, heappush
+from math import sqrt
+from multiprocessing import Pool
+
+from nm_box_index import get_box_index, locate
+from nm_meshfile import load_mesh
+
+
+class PathQueryEngine:
+    """
+    Answers many source/destination path queries against a single mesh.
+
+    The mesh is converted once into integer-indexed arrays: box bounds, and a compressed adjacency list where the
+    neighbors of box i are neighbors[offsets[i]:offsets[i + 1]]. The per-query search tables (distances, predecessors
+    and points) are allocated once and reused; a generation stamp marks which entries belong to the current query, so
+    nothing has to be cleared between queries.
+    """
+
+    def __init__(self, mesh):
+        """
+        Args:
+            mesh: a dictionary containing 'boxes' and 'adj' as produced by nm_meshbuilder, or an ArrayMesh.
+        """
+        self.mesh = mesh
+        self.boxes = list(mesh['boxes'])
+        self.box_ids = {box: i for i, box in enumerate(self.boxes)}
+        self.index = get_box_index(mesh)
+
+        # Compressed adjacency. The bounds each neighbor clamps points into are stored alongside its id so the inner
+        # loop of the search does not have to look them up.
+        if hasattr(mesh, 'offsets'):
+            # A memory-mapped ArrayMesh already stores its adjacency in this form.
+            self.offsets = mesh.offsets.tolist()
+            self.neighbors = mesh.neighbors.tolist()
+            bounds = mesh.boxes[mesh.neighbors]
+            self.clamp_x1, self.clamp_x2 = bounds[:, 0].tolist(), (bounds[:, 1] - 1).tolist()
+            self.clamp_y1, self.clamp_y2 = bounds[:, 2].tolist(), (bounds[:, 3] - 1).tolist()
+        else:
+            self.offsets = [0]
+            self.neighbors = []
+            self.clamp_x1, self.clamp_x2 = [], []
+            self.clamp_y1, self.clamp_y2 = [], []
+            adj = mesh['adj']
+            for box in self.boxes:
+                for neighbor in adj.get(box, []):
+                    x1, x2, y1, y2 = neighbor
+                    self.neighbors.append(self.box_ids[neighbor])
+                    self.clamp_x1.append(x1)
+                    self.clamp_x2.append(x2 - 1)
+                    self.clamp_y1.append(y1)
+                    self.clamp_y2.append(y2 - 1)
+                self.offsets.append(len(self.neighbors))
+
+        # Connected component of every box, so queries with no possible path are rejected without searching.
+        self.component = [-1] * len(self.boxes)
+        for root in range(len(self.boxes)):
+            if self.component[root] != -1:
+                continue
+            self.component[root] = root
+            stack = [root]
+            while stack:
+                current = stack.pop()
+                for k in range(self.offsets[current], self.offsets[current + 1]):
+                    neighbor = self.neighbors[k]
+                    if self.component[neighbor] == -1:
+                        self.component[neighbor] = root
+                        stack.append(neighbor)
+
+        # Scratch buffers reused by every query.
+        n = len(self.boxes)
+        self._generation = 0
+        self._stamp = [0] * n
+        self._distance = [0.0] * n
+        self._prev = [-1] * n
+        self._point = [None] * n
+
+        self._pool = None
+        self._pool_processes = 0
+
+        self.queries = 0
+        self.expanded = 0
+
+    @classmethod
+    def from_file(cls, filename):
+        """Loads a pickled or binary mesh and builds an engine over it."""
+        return cls(load_mesh(filename))
+
+    def find_box_id(self, point):
+        """Returns the index of the box containing the point, or None if it is outside the mesh."""
+        box = locate(self.index, point)
+        if box is None:
+            return None
+        return self.box_ids[box]
+
+    def find_path(self, source_point, destination_point):
+        """
+        Searches for a path from source_point to destination_point using A* over the box graph.
+
+        Like nm_pathfinder.find_path, the path visits one point per box, clamped from the previous point into the
+        bounds of the next box.
+
+        Returns:
+            A path (list of points) from source_point to destination_point, or an empty list if there is none.
+        """
+        self.queries += 1
+        start = self.find_box_id(source_point)
+        goal = self.find_box_id(destination_point)
+        if start is None or goal is None or self.component[start] != self.component[goal]:
+            return []
+
+        self._generation += 1
+        generation = self._generation
+        stamp, distance, prev, point = self._stamp, self._distance, self._prev, self._point
+        offsets, neighbors = self.offsets, self.neighbors
+        clamp_x1, clamp_x2, clamp_y1, clamp_y2 = self.clamp_x1, self.clamp_x2, self.clamp_y1, self.clamp_y2
+        dx, dy = destination_point
+
+        stamp[start] = generation
+        distance[start] = 0.0
+        prev[start] = -1
+        point[start] = source_point
+        queue = [(sqrt((source_point[0] - dx)**2 + (source_point[1] - dy)**2), 0.0, start)]
+        expanded = 0
+
+        while queue:
+            _, cost, current = heappop(queue)
+            if cost > distance[current]:
+                continue  # Stale entry; this box was reached more cheaply after it was queued.
+            if current == goal:
+                break
+            expanded += 1
+
+            px, py = point[current]
+            for k in range(offsets[current], offsets[current + 1]):
+                nx = min(max(px, clamp_x1[k]), clamp_x2[k])
+                ny = min(max(py, clamp_y1[k]), clamp_y2[k])
+                next_cost = cost + sqrt((px - nx)**2 + (py - ny)**2)
+
+                neighbor = neighbors[k]
+                if stamp[neighbor] != generation or next_cost < distance[neighbor]:
+                    stamp[neighbor] = generation
+                    distance[neighbor] = next_cost
+                    prev[neighbor] = current
+                    point[neighbor] = (nx, ny)
+                    heappush(queue, (next_cost + sqrt((nx - dx)**2 + (ny - dy)**2), next_cost, neighbor))
+        else:
+            self.expanded += expanded
+            return []
+
+        self.expanded += expanded
+
+        path = [destination_point]
+        box = goal
+        while box != -1:
+            if point[box] != path[-1]:
+                path.append(point[box])
+            box = prev[box]
+        path.reverse()
+        return path
+
+    def find_paths(self, pairs, processes=None, chunksize=64):
+        """
+        Answers a batch of queries.
+
+        Args:
+            pairs: a list of (source_point, destination_point) tuples.
+            processes: when greater than one, the queries are spread over a process pool of that size. The pool is
+                kept for later batches until close() is called.
+            chunksize: the number of queries sent to a worker at a time.
+
+        Returns:
+            A list of paths in the same order as pairs.
+        """
+        if not processes or processes <= 1:
+            return [self.find_path(source, destination) for source, destination in pairs]
+
+        if self._pool is None or self._pool_processes != processes:
+            self.close()
+            self._pool = Pool(processes, initializer=_init_worker, initargs=(self.mesh,))
+            self._pool_processes = processes
+
+        self.queries += len(pairs)
+        results = self._pool.map(_worker_find_path, pairs, chunksize)
+        # The searches ran in the workers' engines; add their node counts to this one's.
+        self.expanded += sum(expanded for _, expanded in results)
+        return [path for path, _ in results]
+
+    def close(self):
+        """Shuts down the process pool, if one was started."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._pool_processes = 0
+
+
+# Each worker process builds its own engine once and answers every query it is sent with it.
+_worker_engine = None
+
+
+def _init_worker(mesh):
+    global _worker_engine
+    _worker_engine = PathQueryEngine(mesh)
+
+
+def _worker_find_path(pair):
+    """Returns the path for a query and the number of boxes its search expanded."""
+    before = _worker_engine.expanded
+    path = _worker_engine.find_path(*pair)
+    return path, _worker_engine.expanded - before
@@ -0,0 +1,183 @@
+from p2_t3_fast import FastBoard, action_tuple, from_board_state
+from random import choice
+from math import log
+from timeit import default_timer as time
+
+import numpy
+
+# Configuration parameters for MCTS, as in mcts_vanilla
+num_nodes = 1000
+explore_faction = 2.
+# Wall-clock budget per move in seconds; when set, it replaces num_nodes
+move_time_limit = None
+
+# Iteration count, duration and rate of the last search
+last_think_stats = {}
+
+
+class ArrayTree:
+    def __init__(self, capacity=1024):
+        """ An MCTS tree stored as a struct of arrays: node i is described by entry i of each array, and the root
+        is node 0. When a node is expanded, all of its children are added at once, in the order of the legal
+        actions, so the children of a node are the contiguous range first_child[i] to first_child[i] +
+        child_count[i]; the next sibling of a node is simply the next index. Unexpanded nodes have first_child -1.
+        Children are tried in order, so tried_count[i] also marks where the untried children of node i start.
+        The arrays double in size when they are full.
+
+        Args:
+            capacity:   The number of nodes allocated at first.
+
+        """
+        self.size = 0
+        self.parent = numpy.empty(capacity, numpy.int32)
+        self.action = numpy.empty(capacity, numpy.int8)        # Action (0-80) of the fast engine leading here
+        self.wins = numpy.empty(capacity, numpy.int32)
+        self.visits = numpy.empty(capacity, numpy.int32)
+        self.first_child = numpy.empty(capacity, numpy.int32)
+        self.child_count = numpy.empty(capacity, numpy.int8)
+        self.tried_count = numpy.empty(capacity, numpy.int8)
+
+    def nbytes(self):
+        """ The memory held by the arrays, allocated capacity included. """
+        return sum(array.nbytes for array in (self.parent, self.action, self.wins, self.visits,
+                                              self.first_child, self.child_count, self.tried_count))
+
+    def reserve(self, count):
+        """ Makes room for count more nodes. """
+        capacity = len(self.parent)
+        if self.size + count <= capacity:
+            return
+        while capacity < self.size + count:
+            capacity *= 2
+        for name in ('parent', 'action', 'wins', 'visits', 'first_child', 'child_count', 'tried_count'):
+            old = getattr(self, name)
+            new = numpy.empty(capacity, old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_root(self):
+        self.reserve(1)
+        self.size = 1
+        self.parent[0] = -1
+        self.action[0] = -1
+        self.wins[0] = self.visits[0] = 0
+        self.first_child[0] = -1
+        self.child_count[0] = self.tried_count[0] = 0
+        return 0
+
+    def expand(self, node, actions):
+        """ Adds the children of node, one per action. Returns the index of the first child. """
+        self.reserve(len(actions))
+        first, last = self.size, self.size + len(actions)
+        self.parent[first:last] = node
+        self.action[first:last] = actions
+        self.wins[first:last] = 0
+        self.visits[first:last] = 0
+        self.first_child[first:last] = -1
+        self.child_count[first:last] = 0
+        self.tried_count[first:last] = 0
+        self.first_child[node] = first
+        self.child_count[node] = len(actions)
+        self.size = last
+        return first
+
+
+def select_child(tree: ArrayTree, node: int, is_opponent: bool):
+    """Picks the child of node with the highest UCB value, computed for all the children at once. Untried
+    children come first, in order, like the untried actions of mcts_vanilla."""
+    first = int(tree.first_child[node])
+    tried = int(tree.tried_count[node])
+    if tried < tree.child_count[node]:
+        tree.tried_count[node] = tried + 1
+        return first + tried
+
+    last = first + tried
+    visits = tree.visits[first:last]
+    win_rate = tree.wins[first:last] / visits
+    if is_opponent:
+        win_rate = 1 - win_rate
+    value = win_rate + explore_faction * numpy.sqrt(log(tree.visits[node]) / visits)
+    return first + int(numpy.argmax(value))
+
+
+def rollout(board: FastBoard, state):
+    """Given the state of the game, the rollout plays out the remainder randomly."""
+    while not board.is_ended(state):
+        state = board.next_state(state, choice(board.legal_actions(state)))
+    return state
+
+
+def backpropagate(tree: ArrayTree, node: int, won: bool):
+    """Updates the win and visit counts from node up to the root."""
+    parent, visits, wins = tree.parent, tree.visits, tree.wins
+    while node != -1:
+        visits[node] += 1
+        if won:
+            wins[node] += 1
+        node = parent[node]
+
+
+def get_best_action(tree: ArrayTree):
+    """Selects the root child with the best mix of win rate and visit share, as mcts_vanilla does."""
+    first = tree.first_child[0]
+    if first == -1:
+        return None
+    last = first + tree.child_count[0]
+    visits = tree.visits[first:last]
+    visited = visits > 0
+    if not visited.any():
+        return int(tree.action[first])
+    value = numpy.full(last - first, -numpy.inf)
+    value[visited] = (0.3 * tree.wins[first:last][visited] / visits[visited] +
+                      0.7 * visits[visited] / tree.visits[0])
+    return int(tree.action[first + int(numpy.argmax(value))])
+
+
+def search(board: FastBoard, current_state, iterations=None, time_limit=None, tree=None):
+    """Builds an ArrayTree from a state of the fast engine and returns it, running until time_limit seconds have
+    passed if one is given, otherwise for the given number of iterations (num_nodes by default)."""
+    if iterations is None:
+        iterations = num_nodes
+    start = time()
+    deadline = None if time_limit is None else start + time_limit
+    done = 0
+
+    bot_identity = board.current_player(current_state)
+    if tree is None:
+        tree = ArrayTree()
+    root = tree.add_root()
+
+    while (done < iterations) if deadline is None else (done == 0 or time() < deadline):
+        node, state = root, current_state
+
+        # Selection and expansion: descend until an unvisited child is reached or the game ends
+        while not board.is_ended(state):
+            if tree.first_child[node] == -1:
+                tree.expand(node, board.legal_actions(state))
+            node = select_child(tree, node, board.current_player(state) != bot_identity)
+            state = board.next_state(state, int(tree.action[node]))
+            if tree.first_child[node] == -1 and tree.visits[node] == 0:
+                break
+
+        end_state = rollout(board, state)
+        backpropagate(tree, node, board.points_values(end_state)[bot_identity] == 1)
+        done += 1
+
+    seconds = time() - start
+    last_think_stats.clear()
+    last_think_stats.update(iterations=done, seconds=seconds,
+                            iterations_per_second=done / seconds if seconds > 0 else float('inf'),
+                            nodes=tree.size, bytes_per_node=tree.nbytes() / tree.size)
+    return tree
+
+
+def think(board, current_state, time_limit=None):
+    """Performs MCTS over an ArrayTree with the fast engine. Takes and returns the states and actions of
+    p2_t3.Board. time_limit (seconds) overrides move_time_limit."""
+    if time_limit is None:
+        time_limit = move_time_limit
+    tree = search(FastBoard(), from_board_state(current_state), time_limit=time_limit)
+    best_action = action_tuple(get_best_action(tree))
+    print(f"Action chosen: {best_action} ({last_think_stats['iterations']} iterations, "
+          f"{last_think_stats['iterations_per_second']:.0f} per second)")
+    return best_action
@@ -1,7 +1,8 @@
+from heapq import heapify, heappop, heappush
 
 
 class MCTSNode:
-    def __init__(self, parent=None, parent_action=None, action_list=[]):
+    def __init__(self, parent=None, parent_action=None, action_list=None):
         """ Initializes the tree node for MCTS. The node stores links to other nodes in the tree (parent and child
         nodes), as well as keeps track of the number of wins and total simulations that have visited the node.
 
@@ -15,7 +16,8 @@ class MCTSNode:
         self.parent_action = parent_action      # The move that got us to this node - "None" for the root node.
 
         self.child_nodes = {}                   # Action -> MCTSNode dictionary of children
-        self.untried_actions = action_list      # Yet unexplored actions
+        # A fresh list by default: a default [] would be shared by every node created without one.
+        self.untried_actions = [] if action_list is None else action_list   # Yet unexplored actions
 
         self.wins = 0                           # Total wins of all paths through this node.
         self.visits = 0                         # Number of times this node has been visited.
@@ -43,3 +45,65 @@ class MCTSNode:
             for child in self.child_nodes.values():
                 string += child.tree_to_string(horizon - 1, indent + 1)
         return string
+
+
+def find_subtree(board, node, node_state, state):
+    """ Looks for the node of a later state in a tree kept from an earlier search, so its statistics can be reused.
+    The state may be node_state itself or one move after it (the opponent's reply); the node found is detached from
+    its parent and becomes a root.
+
+    Args:
+        board:      The game setup.
+        node:       The node kept from the earlier search.
+        node_state: The state of that node.
+        state:      The state to search from now.
+
+    Returns:        The node of state, or None if the tree never explored it.
+
+    """
+    if node_state != state:
+        for action, child in node.child_nodes.items():
+            if board.next_state(node_state, action) == state:
+                node = child
+                break
+        else:
+            return None
+    node.parent = None
+    node.parent_action = None
+    return node
+
+
+def count_nodes(root):
+    """ Returns the number of nodes in the tree below root, root included. """
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.child_nodes.values())
+    return count
+
+
+def prune_tree(root, max_nodes):
+    """ Bounds the size of a tree by keeping only its max_nodes most visited nodes. A node is kept only with its
+    parent, so the tree stays connected; the actions of dropped children go back to their parent's untried actions
+    and will be expanded again if the search returns to them.
+
+    Returns:        The number of nodes kept.
+
+    """
+    kept = 1
+    frontier = [(-child.visits, id(child), child) for child in root.child_nodes.values()]
+    heapify(frontier)
+    while frontier and kept < max_nodes:
+        _, _, node = heappop(frontier)
+        kept += 1
+        for child in node.child_nodes.values():
+            heappush(frontier, (-child.visits, id(child), child))
+
+    # Whatever is left in the frontier is dropped, along with the nodes below it.
+    for _, _, node in frontier:
+        parent = node.parent
+        del parent.child_nodes[node.parent_action]
+        parent.untried_actions.append(node.parent_action)
+    return kept
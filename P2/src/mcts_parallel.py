@@ -0,0 +1,173 @@
+from mcts_node import MCTSNode
+from p2_t3 import Board
+from multiprocessing import Pool
+import atexit
+import importlib
+import os
+import random
+from timeit import default_timer as time
+
+import mcts_vanilla
+
+# Configuration parameters for parallel MCTS
+# Number of worker processes
+workers = os.cpu_count() or 1
+# The serial bot whose search, rollouts and final move choice are run in parallel; one of ROOT_BOTS for think, of
+# LEAF_BOTS for think_leaf
+base_bot = mcts_vanilla
+# Iterations per worker tree (root parallelism) or of the shared tree (leaf parallelism); by default the base bot's
+# num_nodes, so every worker spends about as long as the serial bot does
+num_nodes = None
+# Wall-clock budget per move in seconds; when set, it replaces num_nodes
+move_time_limit = None
+# Leaves selected before the workers are sent their rollouts, in leaf parallelism. Each batch costs one round trip
+# to the pool, which takes longer than a random rollout: with a batch of one, leaf parallelism is slower than the
+# serial bot. It only pays off when the rollouts of a batch take much longer than that round trip.
+leaf_batch = 16
+
+# Bots whose search returns an MCTSNode root, for root parallelism, and bots whose phase functions have the
+# signatures of mcts_vanilla's, for leaf parallelism
+ROOT_BOTS = ('mcts_vanilla', 'mcts_modified', 'mcts_rave')
+LEAF_BOTS = ('mcts_vanilla', 'mcts_modified')
+
+# Iteration count (summed over the workers' trees), duration and rate of the last search
+last_think_stats = {}
+
+_pool = None
+_pool_size = 0
+
+
+def get_pool():
+    """Returns the process pool, starting it (again) if the number of workers changed."""
+    global _pool, _pool_size
+    if _pool is None or _pool_size != workers:
+        close_pool()
+        _pool = Pool(workers)
+        _pool_size = workers
+    return _pool
+
+
+def close_pool():
+    """Stops the worker processes."""
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool = None
+
+
+atexit.register(close_pool)
+
+
+def get_bot(name, supported):
+    """Imports the bot module of the given name, which has to be one of supported."""
+    if name not in supported:
+        raise ValueError("mcts_parallel cannot run %s; use one of %s" % (name, ", ".join(supported)))
+    return importlib.import_module(name)
+
+
+def _root_search(task):
+    """Worker task: grows an independent tree and returns its root child statistics."""
+    module_name, board, state, iterations, time_limit, seed = task
+    # Forked workers start with the same random state, which would make every tree identical.
+    random.seed(seed)
+    bot = get_bot(module_name, ROOT_BOTS)
+    root_node = bot.search(board, state, iterations, time_limit)
+    statistics = {action: (child.wins, child.visits) for action, child in root_node.child_nodes.items()}
+    return statistics, bot.last_think_stats['iterations']
+
+
+def _leaf_rollout(task):
+    """Worker task: plays one rollout from a leaf and returns the final points."""
+    module_name, board, state, seed = task
+    random.seed(seed)
+    bot = get_bot(module_name, LEAF_BOTS)
+    return board.points_values(bot.rollout(board, state))
+
+
+def merge_roots(results):
+    """Sums the root child statistics of several trees into a single root node."""
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=[])
+    for statistics in results:
+        for action, (wins, visits) in statistics.items():
+            if action not in root_node.child_nodes:
+                root_node.child_nodes[action] = MCTSNode(parent=root_node, parent_action=action, action_list=[])
+            child = root_node.child_nodes[action]
+            child.wins += wins
+            child.visits += visits
+            root_node.visits += visits
+    return root_node
+
+
+def record_stats(iterations, start):
+    seconds = time() - start
+    last_think_stats.update(iterations=iterations, seconds=seconds,
+                            iterations_per_second=iterations / seconds if seconds > 0 else float('inf'))
+
+
+def root_search(board: Board, current_state, time_limit=None):
+    """Root parallelism: every worker grows its own tree from current_state, and the visit and win counts of
+    the root children are summed over the trees."""
+    start = time()
+    get_bot(base_bot.__name__, ROOT_BOTS)
+    iterations = base_bot.num_nodes if num_nodes is None else num_nodes
+    tasks = [(base_bot.__name__, board, current_state, iterations, time_limit, random.getrandbits(64))
+             for _ in range(workers)]
+    results = get_pool().map(_root_search, tasks, chunksize=1)
+    record_stats(sum(done for _, done in results), start)
+    return merge_roots(statistics for statistics, _ in results)
+
+
+def leaf_search(board: Board, current_state, time_limit=None):
+    """Leaf parallelism: a single tree, where every leaf added is evaluated by one rollout per worker. The leaves
+    are selected leaf_batch at a time, and all the rollouts of a batch are sent to the pool at once."""
+    get_bot(base_bot.__name__, LEAF_BOTS)
+    start = time()
+    deadline = None if time_limit is None else start + time_limit
+    iterations = base_bot.num_nodes if num_nodes is None else num_nodes
+    done = 0
+    bot_identity = board.current_player(current_state)
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
+    pool = get_pool()
+
+    while (done < iterations) if deadline is None else (done == 0 or time() < deadline):
+        leaves = []
+        for _ in range(min(leaf_batch, iterations - done) if deadline is None else leaf_batch):
+            node, state = base_bot.traverse_nodes(root_node, board, current_state, bot_identity)
+            if not board.is_ended(state):
+                node, state = base_bot.expand_leaf(node, board, state)
+            leaves.append((node, state))
+
+        # One chunk of the batch per worker
+        tasks = [(base_bot.__name__, board, state, random.getrandbits(64)) for _, state in leaves
+                 for _ in range(workers)]
+        outcomes = pool.map(_leaf_rollout, tasks, chunksize=-(-len(tasks) // workers))
+        for i, outcome in enumerate(outcomes):
+            base_bot.backpropagate(leaves[i // workers][0], outcome[bot_identity] == 1)
+        done += len(leaves)
+
+    record_stats(done, start)
+    return root_node
+
+
+def report(best_action):
+    print(f"Action chosen: {best_action} ({last_think_stats['iterations']} iterations, "
+          f"{last_think_stats['iterations_per_second']:.0f} per second)")
+
+
+def think(board: Board, current_state, time_limit=None):
+    """Performs root parallel MCTS. time_limit (seconds) overrides move_time_limit."""
+    if time_limit is None:
+        time_limit = move_time_limit
+    best_action = base_bot.get_best_action(root_search(board, current_state, time_limit))
+    report(best_action)
+    return best_action
+
+
+def think_leaf(board: Board, current_state, time_limit=None):
+    """Performs leaf parallel MCTS. time_limit (seconds) overrides move_time_limit."""
+    if time_limit is None:
+        time_limit = move_time_limit
+    best_action = base_bot.get_best_action(leaf_search(board, current_state, time_limit))
+    report(best_action)
+    return best_action
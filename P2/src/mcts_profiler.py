@@ -0,0 +1,161 @@
+import argparse
+import importlib
+import io
+import json
+import random
+from contextlib import redirect_stdout
+from timeit import default_timer as clock
+
+from mcts_node import count_nodes
+from p2_t3 import Board
+
+# Instrumentation for the searches of mcts_vanilla and mcts_modified. A bot whose module setting profiler holds a
+# Profiler runs each iteration through Profiler.iteration, which times the four phases of MCTS; with the setting
+# left at None, the search loop only pays for one test per iteration.
+
+PHASES = ('selection', 'expansion', 'rollout', 'backpropagation')
+
+
+class Profiler:
+    def __init__(self, trace_limit=100000):
+        """ Collects per-phase timers, counters and tree sizes over the searches of one or more bots.
+
+        Attributes:
+            moves:  One dict per search, in order: the bot, player and iteration count, the seconds spent in each
+                    phase, the maximal and mean depth of the expanded leaves, the mean number of legal actions of
+                    the nodes added, and the size of the tree.
+            events: The Chrome trace events of the searches and of their phases, in microseconds.
+
+        Args:
+            trace_limit:    The number of phase events kept for the trace; the timers keep counting past it.
+
+        """
+        self.moves = []
+        self.events = []
+        self.trace_limit = trace_limit
+        self.origin = clock()
+        self._move = None
+
+    def _event(self, name, category, player, start, end):
+        self.events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': 1, 'tid': player,
+                            'ts': 1e6 * (start - self.origin), 'dur': 1e6 * (end - start)})
+
+    def start_move(self, bot, player, reused_visits=0):
+        """ Starts the record of a search by bot (a module name) for player. """
+        self._move = {'bot': bot, 'player': player, 'start': clock(), 'iterations': 0,
+                      'reused_visits': reused_visits, 'phase_seconds': dict.fromkeys(PHASES, 0.),
+                      'max_depth': 0, 'depth_total': 0, 'expansions': 0, 'branching_total': 0}
+
+    def iteration(self, bot, board, root_node, state, bot_identity):
+        """ Runs one iteration of MCTS from root_node with the phase functions of the bot module, timing each. """
+        move = self._move
+        t0 = clock()
+        node, state = bot.traverse_nodes(root_node, board, state, bot_identity)
+        t1 = clock()
+        if not board.is_ended(state):
+            node, state = bot.expand_leaf(node, board, state)
+            move['expansions'] += 1
+            move['branching_total'] += len(node.untried_actions)
+        t2 = clock()
+        end_state = bot.rollout(board, state)
+        t3 = clock()
+        bot.backpropagate(node, bot.is_win(board, end_state, bot_identity))
+        t4 = clock()
+
+        seconds = move['phase_seconds']
+        seconds['selection'] += t1 - t0
+        seconds['expansion'] += t2 - t1
+        seconds['rollout'] += t3 - t2
+        seconds['backpropagation'] += t4 - t3
+        depth = 0
+        while node is not root_node:
+            node = node.parent
+            depth += 1
+        move['depth_total'] += depth
+        move['max_depth'] = max(move['max_depth'], depth)
+        move['iterations'] += 1
+
+        if len(self.events) < self.trace_limit:
+            for name, start, end in zip(PHASES, (t0, t1, t2, t3), (t1, t2, t3, t4)):
+                self._event(name, move['bot'], move['player'], start, end)
+
+    def end_move(self, root_node, iterations, nodes=None):
+        """ Completes the record of the current search, given its root, its iteration count and, for searches that
+        do not build a tree, the number of nodes they hold. """
+        move = self._move
+        self._move = None
+        start, end = move.pop('start'), clock()
+        self._event('search', move['bot'], move['player'], start, end)
+
+        move['iterations'] = iterations
+        move['seconds'] = end - start
+        move['mean_depth'] = move.pop('depth_total') / iterations if iterations else 0.
+        move['branching'] = move.pop('branching_total') / move['expansions'] if move['expansions'] else 0.
+        move['tree_nodes'] = count_nodes(root_node) if nodes is None else nodes
+        move['root_visits'] = root_node.visits
+        move['root_children'] = len(root_node.child_nodes)
+        self.moves.append(move)
+
+    def summary(self):
+        """ Totals over all the recorded searches, per bot: moves, iterations, seconds and the share of the
+        profiled time spent in each phase. """
+        bots = {}
+        for move in self.moves:
+            total = bots.setdefault(move['bot'], {'moves': 0, 'iterations': 0, 'seconds': 0., 'max_depth': 0,
+                                                  'phase_seconds': dict.fromkeys(PHASES, 0.)})
+            total['moves'] += 1
+            total['iterations'] += move['iterations']
+            total['seconds'] += move['seconds']
+            total['max_depth'] = max(total['max_depth'], move['max_depth'])
+            for phase in PHASES:
+                total['phase_seconds'][phase] += move['phase_seconds'][phase]
+        for total in bots.values():
+            profiled = sum(total['phase_seconds'].values())
+            total['phase_share'] = {phase: seconds / profiled if profiled else 0.
+                                    for phase, seconds in total['phase_seconds'].items()}
+        return bots
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'summary': self.summary(), 'moves': self.moves}, f, indent=1)
+
+    def write_trace(self, filename):
+        """ Writes the events in the Chrome trace format, for chrome://tracing or Perfetto. """
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Profiles the searches of an MCTS bot over one game against itself.")
+    parser.add_argument('bot', choices=['mcts_vanilla', 'mcts_modified'])
+    parser.add_argument('--moves', type=int, default=10, help="moves of the game that are searched")
+    parser.add_argument('--time-limit', type=float, default=None, help="seconds per move (num_nodes by default)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="file to write the per-move records to")
+    parser.add_argument('--trace', help="file to write the Chrome trace to")
+    args = parser.parse_args()
+
+    bot = importlib.import_module(args.bot)
+    bot.use_opening_book = False
+    bot.profiler = profiler = Profiler()
+    random.seed(args.seed)
+    board = Board()
+    state = board.starting_state()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(args.moves):
+            if board.is_ended(state):
+                break
+            state = board.next_state(state, bot.think(board, state, time_limit=args.time_limit))
+
+    print("%-5s %6s %10s %6s %7s %8s  %s" % ("move", "iters", "seconds", "depth", "branch", "nodes",
+                                              "  ".join("%-15s" % phase for phase in PHASES)))
+    for i, move in enumerate(profiler.moves):
+        profiled = sum(move['phase_seconds'].values()) or 1.
+        print("%-5d %6d %10.3f %6d %7.1f %8d  %s" % (
+            i, move['iterations'], move['seconds'], move['max_depth'], move['branching'], move['tree_nodes'],
+            "  ".join("%6.3f s (%3.0f%%)" % (s, 100 * s / profiled) for s in move['phase_seconds'].values())))
+    if args.json:
+        profiler.write_json(args.json)
+    if args.trace:
+        profiler.write_trace(args.trace)
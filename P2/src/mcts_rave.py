@@ -0,0 +1,169 @@
+from mcts_node import MCTSNode
+from mcts_search import get_best_action, is_win
+import opening_book
+from p2_t3 import Board
+from random import choice
+from math import sqrt, log
+from timeit import default_timer as time
+
+# MCTS with RAVE (rapid action value estimation): besides its own statistics, every node keeps all-moves-as-first
+# (AMAF) statistics for each action of the player to move there, counting every simulation through the node in
+# which that player made the move later on, in the tree or in the rollout. A cell of the big board is played at most
+# once per game, so the AMAF value of an action is a fair first guess of its value, available after a few
+# simulations where the node's own statistics need many. Selection blends the two, leaning on AMAF while a child
+# has few visits.
+
+# Configuration parameters for MCTS, as in mcts_vanilla. The AMAF statistics already spread the simulations over
+# the moves; no exploration term played best in short tuning runs at 250 iterations, and at 1000 iterations it
+# scored 0.76 (95% CI 0.68-0.84) over 100 rounds against mcts_vanilla (p2_sim --rounds 100 --seed 1000).
+num_nodes = 1000
+explore_faction = 0.
+# Wall-clock budget per move in seconds; when set, it replaces num_nodes
+move_time_limit = None
+# Visits at which a child's own win rate and its AMAF win rate weigh the same in selection
+rave_equivalence = 300
+# Whether think plays the moves of the opening book, when the book file exists and covers the position
+use_opening_book = True
+opening_book_file = opening_book.BOOK_FILE
+
+# Iteration count, duration and rate of the last search
+last_think_stats = {}
+
+
+class RaveNode(MCTSNode):
+    def __init__(self, parent=None, parent_action=None, action_list=None):
+        """ An MCTSNode with the AMAF statistics of the actions of the player to move at the node.
+
+        Attributes:
+            amaf_wins:      Action -> wins of the simulations through this node in which the player to move here
+                            made the action later on.
+            amaf_visits:    Action -> number of those simulations.
+
+        """
+        super().__init__(parent, parent_action, action_list)
+        self.amaf_wins = {}
+        self.amaf_visits = {}
+
+
+def amaf_rate(node: RaveNode, action, is_opponent: bool):
+    """The AMAF win rate of an action at node, from the point of view of the player to move there; None without
+    samples."""
+    visits = node.amaf_visits.get(action, 0)
+    if not visits:
+        return None
+    win_rate = node.amaf_wins.get(action, 0) / visits
+    return 1 - win_rate if is_opponent else win_rate
+
+
+def rave_ucb(node: RaveNode, action, child: RaveNode, is_opponent: bool):
+    """The UCB value of a child, with its win rate blended with the AMAF win rate of its action."""
+    win_rate = child.wins / child.visits
+    if is_opponent:
+        win_rate = 1 - win_rate
+    amaf = amaf_rate(node, action, is_opponent)
+    if amaf is not None:
+        beta = sqrt(rave_equivalence / (3 * child.visits + rave_equivalence))
+        win_rate = (1 - beta) * win_rate + beta * amaf
+    return win_rate + explore_faction * sqrt(log(node.visits) / child.visits)
+
+
+def traverse_nodes(node: RaveNode, board: Board, state, bot_identity: int, moves):
+    """Descends from node to a node with untried actions or a terminal state, appending the actions taken to
+    moves."""
+    while not board.is_ended(state) and not node.untried_actions and node.child_nodes:
+        is_opponent = board.current_player(state) != bot_identity
+        action, node = max(node.child_nodes.items(),
+                           key=lambda item: rave_ucb(node, item[0], item[1], is_opponent))
+        state = board.next_state(state, action)
+        moves.append(action)
+    return node, state
+
+
+def expand_leaf(node: RaveNode, board: Board, state, bot_identity: int, moves):
+    """Adds the child of the untried action with the best AMAF win rate (the first untried action when none has
+    samples) and appends that action to moves."""
+    is_opponent = board.current_player(state) != bot_identity
+    rates = [amaf_rate(node, action, is_opponent) for action in node.untried_actions]
+    index = max(range(len(rates)), key=lambda i: -1 if rates[i] is None else rates[i])
+    action = node.untried_actions.pop(index)
+    state = board.next_state(state, action)
+    child = RaveNode(parent=node, parent_action=action, action_list=board.legal_actions(state))
+    node.child_nodes[action] = child
+    moves.append(action)
+    return child, state
+
+
+def rollout(board: Board, state, moves):
+    """Plays the remainder of the game randomly, appending the actions played to moves."""
+    while not board.is_ended(state):
+        action = choice(board.legal_actions(state))
+        state = board.next_state(state, action)
+        moves.append(action)
+    return state
+
+
+def backpropagate(node: RaveNode, depth: int, won: bool, moves):
+    """Updates the statistics of node, at the given depth below the root, and of its ancestors. moves holds the
+    actions of the simulation from the root; since the players alternate, the actions of the player to move at
+    depth d are moves[d], moves[d + 2] and so on."""
+    while node is not None:
+        node.visits += 1
+        if won:
+            node.wins += 1
+        amaf_wins, amaf_visits = node.amaf_wins, node.amaf_visits
+        for action in moves[depth::2]:
+            amaf_visits[action] = amaf_visits.get(action, 0) + 1
+            if won:
+                amaf_wins[action] = amaf_wins.get(action, 0) + 1
+        node = node.parent
+        depth -= 1
+
+
+def search(board: Board, current_state, iterations=None, time_limit=None):
+    """Builds the MCTS tree from current_state and returns its root node, running until time_limit seconds have
+    passed if one is given, otherwise for the given number of iterations (num_nodes by default)."""
+    if iterations is None:
+        iterations = num_nodes
+    start = time()
+    deadline = None if time_limit is None else start + time_limit
+    done = 0
+
+    bot_identity = board.current_player(current_state)
+    root_node = RaveNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
+
+    while (done < iterations) if deadline is None else (done == 0 or time() < deadline):
+        moves = []
+        node, state = traverse_nodes(root_node, board, current_state, bot_identity, moves)
+        if not board.is_ended(state):
+            node, state = expand_leaf(node, board, state, bot_identity, moves)
+        depth = len(moves)
+        end_state = rollout(board, state, moves)
+        backpropagate(node, depth, is_win(board, end_state, bot_identity), moves)
+        done += 1
+
+    seconds = time() - start
+    last_think_stats.clear()
+    last_think_stats.update(iterations=done, seconds=seconds,
+                            iterations_per_second=done / seconds if seconds > 0 else float('inf'),
+                            root_visits=root_node.visits)
+    return root_node
+
+
+def think(board: Board, current_state, time_limit=None):
+    """Performs MCTS with RAVE and returns the chosen action. time_limit (seconds) overrides move_time_limit."""
+    if time_limit is None:
+        time_limit = move_time_limit
+
+    if use_opening_book:
+        book_action = opening_book.lookup(current_state, opening_book_file)
+        if book_action is not None:
+            last_think_stats.clear()
+            last_think_stats.update(iterations=0, seconds=0., iterations_per_second=0., opening_book=True)
+            print(f"Action chosen: {book_action} (opening book)")
+            return book_action
+
+    root_node = search(board, current_state, time_limit=time_limit)
+    best_action = get_best_action(root_node)
+    print(f"Action chosen: {best_action} ({last_think_stats['iterations']} iterations, "
+          f"{last_think_stats['iterations_per_second']:.0f} per second)")
+    return best_action
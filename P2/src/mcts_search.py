@@ -0,0 +1,232 @@
+from mcts_node import MCTSNode, find_subtree, prune_tree
+from transposition import TranspositionTable
+import transposition
+import opening_book
+from p2_t3 import Board
+from timeit import default_timer as time
+
+# The parts of MCTS shared by mcts_vanilla and mcts_modified. search and think drive the search of a bot module
+# through its phase functions (traverse_nodes, expand_leaf, rollout, backpropagate, is_win), its get_best_action, and
+# its module settings: num_nodes, explore_faction, move_time_limit, the opening book, tree reuse, transposition and
+# profiler settings, and the last_think_stats, kept_trees and transposition_tables it keeps between moves. The bots
+# differ in their rollout and ucb functions.
+
+def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int, ucb):
+    """Traverses the tree until the end criterion are met, selecting children with the bot's ucb function."""
+    current_node = node
+    current_state = state
+
+    # Continue traversing until we reach a terminal state
+    while not board.is_ended(current_state):
+        # If we find a node with untried actions, select it for expansion
+        if current_node.untried_actions:
+            return current_node, current_state
+
+        # Implementation of the selection phase using Upper Confidence Bound (UCB)
+        # This helps balance exploration and exploitation during tree traversal
+        best_value = float('-inf')
+        best_child = None
+        best_action = None
+
+        # Evaluate all child nodes using UCB formula
+        for action in current_node.child_nodes:
+            child = current_node.child_nodes[action]
+            # Adjust UCB calculation based on whether it's opponent's turn
+            is_opponent = board.current_player(current_state) != bot_identity
+            value = ucb(child, is_opponent)
+            
+            if value > best_value:
+                best_value = value
+                best_child = child
+                best_action = action
+
+        # If no children are available, return current node
+        if best_child is None:
+            return current_node, current_state
+
+        # Move to the selected child node
+        current_node = best_child
+        current_state = board.next_state(current_state, best_action)
+
+    return current_node, current_state
+
+def expand_leaf(node: MCTSNode, board: Board, state):
+    """Adds a new leaf to the tree by creating a new child node."""
+    if board.is_ended(state):
+        return node, state
+
+    # Systematic expansion by always trying the first untried action
+    # This ensures a more structured exploration of the game tree
+    action = node.untried_actions[0]
+    new_state = board.next_state(state, action)
+    node.untried_actions.remove(action)
+    
+    # Create new child node with all possible actions from the new state
+    child_node = MCTSNode(
+        parent=node,
+        parent_action=action,
+        action_list=board.legal_actions(new_state)
+    )
+    
+    # Add the new child to the tree
+    node.child_nodes[action] = child_node
+    return child_node, new_state
+
+def backpropagate(node: MCTSNode|None, won: bool):
+    """Navigates the tree from a leaf node to the root, updating the win and visit count."""
+    current = node
+    # Update statistics for each node in the path from leaf to root
+    while current is not None:
+        current.visits += 1
+        # Only increment wins for actual victories, not draws
+        if won:
+            current.wins += 1
+        current = current.parent
+
+def get_best_action(root_node: MCTSNode):
+    """Selects the best action from the root node in the MCTS tree."""
+    best_action = None
+    best_value = float('-inf')
+    
+    # Advanced action selection considering both win rate and visit count
+    # This helps choose more reliable moves with sufficient exploration
+    for action, child in root_node.child_nodes.items():
+        if child.visits == 0:
+            continue
+            
+        # Weighted combination of win rate and visit frequency
+        visit_weight = 0.7  # Bias towards more explored nodes
+        win_rate = child.wins / child.visits
+        visit_rate = child.visits / root_node.visits
+        value = (1 - visit_weight) * win_rate + visit_weight * visit_rate
+        
+        if value > best_value:
+            best_value = value
+            best_action = action
+    
+    # Fallback strategy if no action meets criteria
+    if best_action is None and root_node.child_nodes:
+        best_action = max(root_node.child_nodes.items(), 
+                         key=lambda x: x[1].visits)[0]
+            
+    return best_action
+
+def is_win(board: Board, state, identity_of_bot: int):
+    """Checks if state is a win state for identity_of_bot."""
+    outcome = board.points_values(state)
+    assert outcome is not None, "is_win was called on a non-terminal state"
+    return outcome[identity_of_bot] == 1
+
+def search(bot, board: Board, current_state, iterations=None, time_limit=None, root_node=None):
+    """Builds the MCTS tree of a bot module from current_state and returns its root node. The search runs until
+    time_limit seconds have passed if one is given, otherwise for the given number of iterations (the bot's
+    num_nodes by default). It continues from root_node, the root of an earlier tree for current_state, if one is
+    given."""
+    if iterations is None:
+        iterations = bot.num_nodes
+    start = time()
+    deadline = None if time_limit is None else start + time_limit
+    done = 0
+
+    # Initialize the root of the game tree
+    bot_identity = board.current_player(current_state)
+    profiler = bot.profiler
+    if bot.use_transpositions:
+        if bot_identity not in bot.transposition_tables:
+            bot.transposition_tables[bot_identity] = TranspositionTable(bot.transposition_capacity,
+                                                                        bot.transposition_policy)
+        table = bot.transposition_tables[bot_identity]
+        known = table.nodes.get(current_state)
+        reused_visits = 0 if known is None else known.visits
+        if profiler is not None:
+            profiler.start_move(bot.__name__, bot_identity, reused_visits)
+        root_node, done = transposition.search(board, current_state, table, bot.rollout, bot.is_win,
+                                               bot.explore_faction, iterations, time_limit)
+        if profiler is not None:
+            profiler.end_move(root_node, done, nodes=len(table))
+        record_stats(bot, start, done, reused_visits, root_node)
+        bot.last_think_stats.update(table_nodes=len(table), table_hit_rate=table.hit_rate())
+        return root_node
+
+    if root_node is None:
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
+    reused_visits = root_node.visits
+    if profiler is not None:
+        profiler.start_move(bot.__name__, bot_identity, reused_visits)
+
+    # Main MCTS loop - builds game tree through repeated simulations
+    # Reading the clock costs far less than an iteration, so it is checked every time; the first iteration
+    # always runs so there is a move to return.
+    while (done < iterations) if deadline is None else (done == 0 or time() < deadline):
+        if profiler is not None:
+            profiler.iteration(bot, board, root_node, current_state, bot_identity)
+            done += 1
+            continue
+
+        state = current_state
+        node = root_node
+
+        # Four phases of MCTS:
+        # 1. Selection - Find promising node to expand
+        node, state = bot.traverse_nodes(node, board, state, bot_identity)
+        
+        # 2. Expansion - Add new node to tree
+        if not board.is_ended(state):
+            node, state = bot.expand_leaf(node, board, state)
+        
+        # 3. Simulation - Random playthrough to terminal state
+        end_state = bot.rollout(board, state)
+        
+        # 4. Backpropagation - Update statistics along path
+        won = bot.is_win(board, end_state, bot_identity)
+        bot.backpropagate(node, won)
+        done += 1
+
+    if profiler is not None:
+        profiler.end_move(root_node, done)
+    record_stats(bot, start, done, reused_visits, root_node)
+    return root_node
+
+def record_stats(bot, start, done, reused_visits, root_node):
+    """Stores the statistics of a search that started at time start in the bot's last_think_stats."""
+    seconds = time() - start
+    bot.last_think_stats.clear()
+    bot.last_think_stats.update(iterations=done, seconds=seconds,
+                            iterations_per_second=done / seconds if seconds > 0 else float('inf'),
+                            reused_visits=reused_visits, root_visits=root_node.visits)
+
+def think(bot, board: Board, current_state, time_limit=None):
+    """Performs MCTS for a bot module by sampling games and calling the appropriate functions. time_limit
+    (seconds) overrides the bot's move_time_limit."""
+    if time_limit is None:
+        time_limit = bot.move_time_limit
+
+    # Opening positions are answered from the book without searching
+    if bot.use_opening_book:
+        book_action = opening_book.lookup(current_state, bot.opening_book_file)
+        if book_action is not None:
+            bot.last_think_stats.clear()
+            bot.last_think_stats.update(iterations=0, seconds=0., iterations_per_second=0., reused_visits=0,
+                                    root_visits=0, opening_book=True)
+            print(f"Action chosen: {book_action} (opening book)")
+            return book_action
+
+    # Continue from the subtree of the previous search that matches the moves played since, if there is one
+    bot_identity = board.current_player(current_state)
+    root_node = None
+    if bot.reuse_tree and not bot.use_transpositions and bot_identity in bot.kept_trees:
+        root_node = find_subtree(board, *bot.kept_trees.pop(bot_identity), current_state)
+    root_node = bot.search(board, current_state, time_limit=time_limit, root_node=root_node)
+
+    # Select final move based on gathered statistics
+    best_action = bot.get_best_action(root_node)
+
+    # Keep the subtree of the chosen move, bounded in size, for the next call
+    if bot.reuse_tree and not bot.use_transpositions and best_action in root_node.child_nodes:
+        subtree = root_node.child_nodes[best_action]
+        subtree.parent = None  # Lets the rest of this tree be freed
+        prune_tree(subtree, bot.max_tree_nodes)
+        bot.kept_trees[bot_identity] = (subtree, board.next_state(current_state, best_action))
+    print(f"Action chosen: {best_action} ({bot.last_think_stats['iterations']} iterations, "
+          f"{bot.last_think_stats['iterations_per_second']:.0f} per second)")
+    return best_action
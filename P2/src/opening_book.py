@@ -0,0 +1,200 @@
+import argparse
+import os
+import random
+from multiprocessing import Pool
+from timeit import default_timer as time
+
+import numpy
+
+import mcts_array
+from p2_t3_fast import FastBoard, action_tuple, from_board_state
+
+# An opening book holds, for the positions of the first plies of the game, the move chosen by a deep MCTS search
+# and its statistics. Positions are stored once per symmetry class: the eight rotations and reflections of the
+# big board, applied to every sub-board too, give equivalent positions, and the book keeps the smallest of them.
+
+# The book read by the bots, next to this module
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.npy')
+
+RECORD = numpy.dtype([
+    ('p1_low', numpy.uint64), ('p1_high', numpy.uint32),    # The 81-bit cell masks, split
+    ('p2_low', numpy.uint64), ('p2_high', numpy.uint32),
+    ('p1_boards', numpy.uint16), ('p2_boards', numpy.uint16),
+    ('constraint', numpy.int8),                             # -1 when the next move is free
+    ('player', numpy.int8),
+    ('action', numpy.int8),                                 # The best move, in the stored orientation
+    ('visits', numpy.int32),                                # Visits of the root of the search
+    ('action_visits', numpy.int32),                         # Visits and wins of the best move
+    ('action_wins', numpy.int32),
+])
+
+
+def _symmetries():
+    """ The eight symmetries of a 3x3 grid, as permutations of the indices 3 * r + c. """
+    results = []
+    for rotation in range(4):
+        for reflect in (False, True):
+            permutation = []
+            for index in range(9):
+                r, c = divmod(index, 3)
+                if reflect:
+                    c = 2 - c
+                for _ in range(rotation):
+                    r, c = c, 2 - r
+                permutation.append(3 * r + c)
+            results.append(tuple(permutation))
+    return results
+
+
+SYMMETRIES = _symmetries()
+INVERSES = [SYMMETRIES.index(tuple(sorted(range(9), key=lambda i: p[i]))) for p in SYMMETRIES]
+# For each symmetry, the image of every 9-bit mask.
+MASK_IMAGES = [tuple(sum(1 << p[i] for i in range(9) if mask >> i & 1) for mask in range(512)) for p in SYMMETRIES]
+
+
+def transform_state(state, symmetry):
+    """ Applies a symmetry to a state of the fast engine. """
+    p1_cells, p2_cells, p1_boards, p2_boards, constraint, player = state
+    permutation, image = SYMMETRIES[symmetry], MASK_IMAGES[symmetry]
+    p1_result = p2_result = 0
+    for k in range(9):
+        shift = 9 * permutation[k]
+        p1_result |= image[p1_cells >> 9 * k & 0x1ff] << shift
+        p2_result |= image[p2_cells >> 9 * k & 0x1ff] << shift
+    return (p1_result, p2_result, image[p1_boards], image[p2_boards],
+            None if constraint is None else permutation[constraint], player)
+
+
+def transform_action(action, symmetry):
+    """ Applies a symmetry to an action of the fast engine. """
+    permutation = SYMMETRIES[symmetry]
+    k, cell = divmod(action, 9)
+    return 9 * permutation[k] + permutation[cell]
+
+
+def state_key(state):
+    """ A state as a tuple of integers, comparable with other keys. """
+    return state[:4] + (-1 if state[4] is None else state[4], state[5])
+
+
+def canonical(state):
+    """ Returns the key of the smallest image of a state under the eight symmetries, and the symmetry giving it. """
+    return min((state_key(transform_state(state, symmetry)), symmetry) for symmetry in range(len(SYMMETRIES)))
+
+
+def _search_state(task):
+    """ Worker task: a deep search of one book position, returning its best move and root statistics. """
+    key, iterations, seed = task
+    random.seed(seed)
+    state = key[:4] + (None if key[4] == -1 else key[4], key[5])
+    tree = mcts_array.search(FastBoard(), state, iterations)
+    first = int(tree.first_child[0])
+    children = [(int(tree.action[i]), int(tree.visits[i]), int(tree.wins[i]))
+                for i in range(first, first + int(tree.child_count[0]))]
+    return key, mcts_array.get_best_action(tree), int(tree.visits[0]), children
+
+
+def build_book(plies, iterations, width=None, processes=None, seed=0):
+    """ Searches every position of the first plies of the game, one deep mcts_array search per position, run in
+    parallel.
+
+    Args:
+        plies:      The number of plies covered: the book has moves for positions with fewer pieces than this.
+        iterations: The iterations of each search.
+        width:      How many of the most visited moves of each position lead to the positions of the next ply; all
+                    of them by default.
+        processes:  The size of the process pool (the CPU count by default).
+        seed:       Seeds the searches.
+
+    Returns:
+        The book, as an array of RECORD entries sorted by position.
+
+    """
+    board = FastBoard()
+    rng = random.Random(seed)
+    positions = [canonical(board.starting_state())[0]]
+    results = []
+    with Pool(processes) as pool:
+        for ply in range(plies):
+            start = time()
+            tasks = [(key, iterations, rng.getrandbits(32)) for key in positions]
+            searched = pool.map(_search_state, tasks, chunksize=1)
+            results.extend(searched)
+            print("ply %d: %d positions in %.1f s" % (ply, len(positions), time() - start))
+
+            following = set()
+            for key, _, _, children in searched:
+                state = key[:4] + (None if key[4] == -1 else key[4], key[5])
+                children = sorted(children, key=lambda child: -child[1])[:width]
+                for action, _, _ in children:
+                    next_state = board.next_state(state, action)
+                    if not board.is_ended(next_state):
+                        following.add(canonical(next_state)[0])
+            positions = sorted(following)
+
+    book = numpy.zeros(len(results), RECORD)
+    for entry, (key, action, visits, children) in zip(book, results):
+        p1_cells, p2_cells, p1_boards, p2_boards, constraint, player = key
+        action_visits, action_wins = next((v, w) for a, v, w in children if a == action)
+        entry['p1_low'], entry['p1_high'] = p1_cells & (1 << 64) - 1, p1_cells >> 64
+        entry['p2_low'], entry['p2_high'] = p2_cells & (1 << 64) - 1, p2_cells >> 64
+        entry['p1_boards'], entry['p2_boards'] = p1_boards, p2_boards
+        entry['constraint'], entry['player'], entry['action'] = constraint, player, action
+        entry['visits'], entry['action_visits'], entry['action_wins'] = visits, action_visits, action_wins
+    book.sort(order=['p1_high', 'p1_low', 'p2_high', 'p2_low'])
+    return book
+
+
+def load_book(filename=BOOK_FILE):
+    """ Reads a book file into a dict from position key to (action, root visits, action visits, action wins). """
+    book = numpy.load(filename)
+    return {
+        (int(e['p1_low']) | int(e['p1_high']) << 64, int(e['p2_low']) | int(e['p2_high']) << 64,
+         int(e['p1_boards']), int(e['p2_boards']), int(e['constraint']), int(e['player'])):
+        (int(e['action']), int(e['visits']), int(e['action_visits']), int(e['action_wins']))
+        for e in book
+    }
+
+
+# Book file name -> loaded book, or None when the file does not exist
+_books = {}
+
+
+def get_book(filename=BOOK_FILE):
+    """ Returns the book of a file, loading it on first use; None if there is no such file. """
+    if filename not in _books:
+        _books[filename] = load_book(filename) if os.path.exists(filename) else None
+    return _books[filename]
+
+
+def lookup(state, filename=BOOK_FILE):
+    """ Looks a p2_t3.Board state up in the book.
+
+    Returns:    The book's (R, C, r, c) action for the state, or None if the book does not cover it.
+
+    """
+    book = get_book(filename)
+    if not book:
+        return None
+    key, symmetry = canonical(from_board_state(state))
+    entry = book.get(key)
+    if entry is None:
+        return None
+    return action_tuple(transform_action(entry[0], INVERSES[symmetry]))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Builds an opening book for the MCTS bots.")
+    parser.add_argument('--plies', type=int, default=2)
+    parser.add_argument('--iterations', type=int, default=50000, help="iterations of the search of each position")
+    parser.add_argument('--width', type=int, default=None,
+                        help="moves of each position followed to the next ply (all by default)")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=BOOK_FILE)
+    args = parser.parse_args()
+
+    book = build_book(args.plies, args.iterations, args.width, args.processes, args.seed)
+    numpy.save(args.output, book)
+    print("Saved %d positions (%d bytes each) to %s" % (len(book), RECORD.itemsize, args.output))
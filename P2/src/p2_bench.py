@@ -0,0 +1,293 @@
+import argparse
+import gc
+import io
+import random
+import tracemalloc
+from contextlib import redirect_stdout
+from timeit import default_timer as time
+
+import mcts_array
+import mcts_modified
+import mcts_node
+import mcts_vanilla
+import p2_t3
+import p2_t3_fast
+import rollout_bot
+import rollout_bot_batched
+import threat_rollout
+import transposition
+
+
+def random_games(board, games, seed):
+    """ Plays random games to the end, choosing each move with a generator seeded with seed.
+
+    Returns:
+        The final state and the list of actions of every game.
+    """
+    rng = random.Random(seed)
+    results = []
+    for _ in range(games):
+        state = board.starting_state()
+        actions = []
+        while not board.is_ended(state):
+            legal = board.legal_actions(state)
+            action = legal[rng.randrange(len(legal))]
+            actions.append(action)
+            state = board.next_state(state, action)
+        results.append((state, actions))
+    return results
+
+
+def bench_rollouts(games, seed):
+    """ Times random rollouts with p2_t3.Board and p2_t3_fast.FastBoard. Both engines list the legal moves in the
+    same order, so the same seed plays the same games; their moves and final states are compared. """
+    timings = {}
+    results = {}
+    for name, board in (('Board', p2_t3.Board()), ('FastBoard', p2_t3_fast.FastBoard())):
+        start = time()
+        results[name] = random_games(board, games, seed)
+        timings[name] = time() - start
+
+    same = all(
+        p2_t3_fast.to_board_state(fast_state) == state and list(map(p2_t3_fast.action_tuple, fast_actions)) == actions
+        for (state, actions), (fast_state, fast_actions) in zip(results['Board'], results['FastBoard']))
+    moves = sum(len(actions) for _, actions in results['Board'])
+
+    print("%d random games, %d moves" % (games, moves))
+    for name, seconds in timings.items():
+        print("%-10s %8.3f s %10.0f rollouts/s %8.2f us/move" % (
+            name, seconds, games / seconds, 1e6 * seconds / moves))
+    print("speedup: %.1fx" % (timings['Board'] / timings['FastBoard']))
+    print("identical games: %s" % same)
+
+
+def bench_reuse(bot_name, games, time_limit, seed):
+    """ Plays bot_name against itself with and without tree reuse at a fixed time per move, and reports how many
+    iterations each search ran and how many visits its root had when the move was chosen (reused visits included).
+    """
+    bot = {'mcts_vanilla': mcts_vanilla, 'mcts_modified': mcts_modified}[bot_name]
+    board = p2_t3.Board()
+    print("%s, %d self-play games, %.3f s per move" % (bot_name, games, time_limit))
+    print("%-8s %8s %14s %14s %14s" % ("reuse", "moves", "iterations", "reused visits", "root visits"))
+
+    # Book moves are not searched, so they would only dilute the statistics.
+    saved = bot.reuse_tree, bot.use_opening_book
+    bot.use_opening_book = False
+    for reuse in (False, True):
+        bot.reuse_tree = reuse
+        random.seed(seed)
+        iterations, reused, visits = [], [], []
+        for _ in range(games):
+            bot.kept_trees.clear()
+            state = board.starting_state()
+            while not board.is_ended(state):
+                with redirect_stdout(io.StringIO()):
+                    action = bot.think(board, state, time_limit)
+                state = board.next_state(state, action)
+                iterations.append(bot.last_think_stats['iterations'])
+                reused.append(bot.last_think_stats['reused_visits'])
+                visits.append(bot.last_think_stats['root_visits'])
+        print("%-8s %8d %14.1f %14.1f %14.1f" % (reuse, len(visits), sum(iterations) / len(iterations),
+                                                 sum(reused) / len(reused), sum(visits) / len(visits)))
+    bot.reuse_tree, bot.use_opening_book = saved
+
+
+def bench_transpositions(bot_name, games, iterations, capacity, seed):
+    """ Plays bot_name against itself with a transposition table under each replacement policy, and reports the
+    table size, its hit rate and the iteration rate. """
+    bot = {'mcts_vanilla': mcts_vanilla, 'mcts_modified': mcts_modified}[bot_name]
+    board = p2_t3.Board()
+    print("%s, %d self-play games, %d iterations per move, capacity %d" % (bot_name, games, iterations, capacity))
+    print("%-8s %12s %12s %10s" % ("policy", "table nodes", "hit rate", "it/s"))
+
+    saved = bot.use_transpositions, bot.num_nodes, bot.transposition_capacity, bot.transposition_policy
+    bot.use_transpositions, bot.num_nodes, bot.transposition_capacity = True, iterations, capacity
+    for policy in transposition.POLICIES:
+        bot.transposition_policy = policy
+        bot.transposition_tables.clear()
+        random.seed(seed)
+        seconds = done = 0
+        for _ in range(games):
+            state = board.starting_state()
+            while not board.is_ended(state):
+                with redirect_stdout(io.StringIO()):
+                    action = bot.think(board, state)
+                state = board.next_state(state, action)
+                seconds += bot.last_think_stats['seconds']
+                done += bot.last_think_stats['iterations']
+        tables = bot.transposition_tables.values()
+        hit_rate = sum(table.hits for table in tables) / sum(table.lookups for table in tables)
+        print("%-8s %12d %12.3f %10.0f" % (policy, max(len(table) for table in tables), hit_rate, done / seconds))
+    bot.use_transpositions, bot.num_nodes, bot.transposition_capacity, bot.transposition_policy = saved
+    bot.transposition_tables.clear()
+
+
+def bench_tree(iterations, repeats, seed):
+    """ Compares MCTSNode trees (mcts_vanilla.search) with ArrayTree (mcts_array.search), both searching with
+    FastBoard from the starting state: iterations per second, then the memory taken per node, traced separately
+    because tracing slows the searches down. """
+    board = p2_t3_fast.FastBoard()
+    state = board.starting_state()
+    print("%d iterations from the starting state, best of %d" % (iterations, repeats))
+    print("%-10s %10s %10s %14s %16s" % ("tree", "it/s", "nodes", "bytes/node", "bytes/iteration"))
+
+    def run_nodes():
+        root = mcts_vanilla.search(board, state, iterations)
+        return root, mcts_node.count_nodes(root)
+
+    def run_arrays():
+        tree = mcts_array.search(board, state, iterations)
+        return tree, tree.size
+
+    for name, run, stats in (('MCTSNode', run_nodes, mcts_vanilla.last_think_stats),
+                             ('ArrayTree', run_arrays, mcts_array.last_think_stats)):
+        rate = 0
+        for _ in range(repeats):
+            random.seed(seed)
+            run()
+            rate = max(rate, stats['iterations_per_second'])
+
+        random.seed(seed)
+        gc.collect()
+        tracemalloc.start()
+        tree, nodes = run()
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("%-10s %10.0f %10d %14.1f %16.1f" % (name, rate, nodes, memory / nodes, memory / iterations))
+        del tree
+
+
+def heuristic_move(board, state):
+    """ One move of the heuristic rollout policy of mcts_modified. """
+    actions = board.legal_actions(state)
+    me = board.current_player(state)
+    scores = [mcts_modified.heuristic(board, board.next_state(state, action), action, me) for action in actions]
+    return mcts_modified.roulette_select(actions, scores)
+
+
+def threat_move(board, state):
+    """ One move of threat_rollout's policy. """
+    fast_state = p2_t3_fast.from_board_state(state)
+    return p2_t3_fast.action_tuple(threat_rollout.choose_action(fast_state, *threat_rollout.threat_masks(fast_state)))
+
+
+def bench_policy(seconds, games, seed):
+    """ Compares the rollout policies of mcts_modified: rollouts per second from the starting state, and the share
+    of games each policy wins against random moves, as a check that the threat policy keeps the bias. """
+    board = p2_t3.Board()
+    state = board.starting_state()
+    saved = mcts_modified.rollout_policy
+    print("%-10s %12s %12s" % ("policy", "rollouts/s", "vs random"))
+
+    def random_move(board, state):
+        return random.choice(board.legal_actions(state))
+
+    for policy, move in (('heuristic', heuristic_move), ('threat', threat_move), ('random', random_move)):
+        mcts_modified.rollout_policy = policy
+        random.seed(seed)
+        count, start = 0, time()
+        while time() - start < seconds:
+            if policy == 'random':
+                random_games(p2_t3_fast.FastBoard(), 1, random.getrandbits(32))
+            else:
+                mcts_modified.rollout(board, state)
+            count += 1
+        rate = count / (time() - start)
+
+        score = 0.
+        for game in range(games):
+            # The policy plays first in even games and second in odd ones.
+            game_state = state
+            while not board.is_ended(game_state):
+                mover = move if board.current_player(game_state) == 1 + game % 2 else random_move
+                game_state = board.next_state(game_state, mover(board, game_state))
+            score += board.win_values(game_state)[1 + game % 2]
+        print("%-10s %12.1f %11.0f%%" % (policy, rate, 100 * score / games))
+    mcts_modified.rollout_policy = saved
+
+
+def bench_batched(positions, seed):
+    """ Times rollout_bot against rollout_bot_batched on positions taken from random games, with their default
+    numbers of rollouts per move, then rollout_bot_batched with 50 ms per move. """
+    board = p2_t3.Board()
+    rng = random.Random(seed)
+    states = []
+    while len(states) < positions:
+        state = board.starting_state()
+        for _ in range(rng.randrange(0, 30)):
+            if board.is_ended(state):
+                break
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+        if not board.is_ended(state):
+            states.append(state)
+    moves = sum(len(board.legal_actions(state)) for state in states)
+
+    print("%d positions, %.1f legal moves on average" % (positions, moves / positions))
+    print("%-20s %8s %10s %14s %12s %16s" % ("bot", "limit", "rollouts", "ms per move", "max ms", "rollouts/s"))
+    for name, bot, time_limit in (('rollout_bot', rollout_bot, None),
+                                  ('rollout_bot_batched', rollout_bot_batched, None),
+                                  ('rollout_bot_batched', rollout_bot_batched, 0.05)):
+        random.seed(seed)
+        rollouts = 0
+        slowest = 0.
+        start = time()
+        with redirect_stdout(io.StringIO()):
+            for state in states:
+                move_start = time()
+                bot.think(board, state, time_limit)
+                slowest = max(slowest, time() - move_start)
+                # rollout_bot keeps no statistics; without a limit it plays all its rollouts.
+                per_move = bot.last_think_stats['rollouts'] if bot is rollout_bot_batched else bot.ROLLOUTS
+                rollouts += per_move * len(board.legal_actions(state))
+        seconds = time() - start
+        print("%-20s %8s %10.0f %14.1f %12.1f %16.0f" % (
+            name, "-" if time_limit is None else "%g ms" % (1e3 * time_limit), rollouts / moves,
+            1e3 * seconds / positions, 1e3 * slowest, rollouts / seconds))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmarks the Ultimate Tic-Tac-Toe engines.")
+    parser.add_argument('--seed', type=int, default=0)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    rollout_parser = subparsers.add_parser('rollout', help="random rollouts with Board against FastBoard")
+    rollout_parser.add_argument('--games', type=int, default=5000)
+
+    reuse_parser = subparsers.add_parser('reuse', help="MCTS iterations per move with and without tree reuse")
+    reuse_parser.add_argument('--bot', choices=['mcts_vanilla', 'mcts_modified'], default='mcts_vanilla')
+    reuse_parser.add_argument('--games', type=int, default=10)
+    reuse_parser.add_argument('--time-limit', type=float, default=0.1)
+
+    table_parser = subparsers.add_parser('transpositions', help="transposition table size and hit rate per policy")
+    table_parser.add_argument('--bot', choices=['mcts_vanilla', 'mcts_modified'], default='mcts_vanilla')
+    table_parser.add_argument('--games', type=int, default=4)
+    table_parser.add_argument('--iterations', type=int, default=1000)
+    table_parser.add_argument('--capacity', type=int, default=20000)
+
+    tree_parser = subparsers.add_parser('tree', help="MCTSNode trees against struct-of-arrays trees")
+    tree_parser.add_argument('--iterations', type=int, default=20000)
+    tree_parser.add_argument('--repeats', type=int, default=3)
+
+    policy_parser = subparsers.add_parser('policy', help="rollouts per second of mcts_modified's rollout policies")
+    policy_parser.add_argument('--seconds', type=float, default=5.)
+    policy_parser.add_argument('--games', type=int, default=40)
+
+    batched_parser = subparsers.add_parser('batched', help="rollout_bot against rollout_bot_batched")
+    batched_parser.add_argument('--positions', type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'rollout':
+        bench_rollouts(args.games, args.seed)
+    elif args.benchmark == 'reuse':
+        bench_reuse(args.bot, args.games, args.time_limit, args.seed)
+    elif args.benchmark == 'transpositions':
+        bench_transpositions(args.bot, args.games, args.iterations, args.capacity, args.seed)
+    elif args.benchmark == 'tree':
+        bench_tree(args.iterations, args.repeats, args.seed)
+    elif args.benchmark == 'policy':
+        bench_policy(args.seconds, args.games, args.seed)
+    elif args.benchmark == 'batched':
+        bench_batched(args.positions, args.seed)
@@ -2,8 +2,12 @@ import sys
 import p2_t3
 import mcts_vanilla
 import mcts_modified
+import mcts_array
+import mcts_rave
+import mcts_parallel
 import random_bot
 import rollout_bot
+import rollout_bot_batched
 
 def get_human_input(board, state):
     move = input("Which move? BoardY BoardX SquareY SquareX (or q to quit) ").strip()
@@ -20,37 +24,44 @@ players = dict(
     human=get_human_input,
     random_bot=random_bot.think,
     rollout_bot=rollout_bot.think,
+    rollout_bot_batched=rollout_bot_batched.think,
     mcts_vanilla=mcts_vanilla.think,
     mcts_modified=mcts_modified.think,
+    mcts_parallel=mcts_parallel.think,
+    mcts_parallel_leaf=mcts_parallel.think_leaf,
+    mcts_array=mcts_array.think,
+    mcts_rave=mcts_rave.think,
 )
 
-board = p2_t3.Board()
-state0 = board.starting_state()
+# The guard keeps worker processes of mcts_parallel from running the games when they import this module.
+if __name__ == '__main__':
+    board = p2_t3.Board()
+    state0 = board.starting_state()
 
-if len(sys.argv) != 3:
-    print("Need two player arguments")
-    exit(1)
+    if len(sys.argv) != 3:
+        print("Need two player arguments")
+        exit(1)
 
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in "+", ".join(players.keys()))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in "+", ".join(players.keys()))
-    exit(1)
+    p1 = sys.argv[1]
+    if p1 not in players:
+        print("p1 not in "+", ".join(players.keys()))
+        exit(1)
+    p2 = sys.argv[2]
+    if p2 not in players:
+        print("p2 not in "+", ".join(players.keys()))
+        exit(1)
 
-player1 = players[p1]
-player2 = players[p2]
-state = state0
-last_action = None
-current_player = player1
-while not board.is_ended(state):
+    player1 = players[p1]
+    player2 = players[p2]
+    state = state0
+    last_action = None
+    current_player = player1
+    while not board.is_ended(state):
+        print(board.display(state, last_action))
+        print("Player "+str(board.current_player(state)))
+        last_action = current_player(board, state)
+        state = board.next_state(state, last_action)
+        current_player = player1 if current_player == player2 else player2
+    print("Finished!")
     print(board.display(state, last_action))
-    print("Player "+str(board.current_player(state)))
-    last_action = current_player(board, state)
-    state = board.next_state(state, last_action)
-    current_player = player1 if current_player == player2 else player2
-print("Finished!")
-print(board.display(state, last_action))
-print(board.points_values(state))
+    print(board.points_values(state))
@@ -1,67 +1,218 @@
+import argparse
+import csv
+import io
+import json
+import random
 import sys
+from contextlib import redirect_stdout
+from math import log10, sqrt
+from multiprocessing import Pool
 from timeit import default_timer as time
 import p2_t3
 import mcts_vanilla
 import mcts_modified
+import mcts_array
+import mcts_rave
+import mcts_parallel
 import random_bot
 import rollout_bot
+import rollout_bot_batched
 
 players = dict(
     random_bot=random_bot.think,
     rollout_bot=rollout_bot.think,
+    rollout_bot_batched=rollout_bot_batched.think,
     mcts_vanilla=mcts_vanilla.think,
     mcts_modified=mcts_modified.think,
+    mcts_parallel=mcts_parallel.think,
+    mcts_parallel_leaf=mcts_parallel.think_leaf,
+    mcts_array=mcts_array.think,
+    mcts_rave=mcts_rave.think,
 )
 
-board = p2_t3.Board()
-state0 = board.starting_state()
+# Bots that start their own worker processes, which the processes of a pool are not allowed to do
+multiprocess_players = {'mcts_parallel', 'mcts_parallel_leaf'}
 
-if len(sys.argv) != 3:
-    print("Need two player arguments")
-    exit(1)
 
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in "+players.keys().join(","))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in "+players.keys().join(","))
-    exit(1)
+def play_game(task):
+    """ Plays one round between the two bots of the tournament, which are called 'p1' and 'p2' whichever moves
+    first.
 
-player1 = players[p1]
-player2 = players[p2]
+    Args:
+        task:   (round number, p1 name, p2 name, seed, whether p2 moves first, time limit, grace, strict, quiet).
 
-rounds = 100
-wins = {'draw':0, 1:0, 2:0}
+    Returns:
+        A dict describing the round: its number and seed, the bot that moved first, the winner ('p1', 'p2' or
+        'draw'), whether it was decided by an overrun, and every move as (bot, seconds, iterations or None).
 
-start = time()  # To log how much time the simulation takes.
-for i in range(rounds):
+    """
+    number, p1, p2, seed, swapped, time_limit, grace, strict, quiet = task
+    random.seed(seed)
+    board = p2_t3.Board()
+    seats = {1: 'p2', 2: 'p1'} if swapped else {1: 'p1', 2: 'p2'}
+    names = {'p1': p1, 'p2': p2}
+
+    output = io.StringIO() if quiet else sys.stdout
+    state = board.starting_state()
+    moves = []
+    forfeit = None
+    with redirect_stdout(output):
+        print("")
+        print("Round %d, fight! (%s moves first)" % (number, names[seats[1]]))
+        while not board.is_ended(state):
+            seat = seats[board.current_player(state)]
+            think = players[names[seat]]
+            move_start = time()
+            action = think(board, state, time_limit=time_limit)
+            move_time = time() - move_start
+            # Bots that report their searches keep the last one in last_think_stats.
+            stats = getattr(sys.modules[think.__module__], 'last_think_stats', {})
+            moves.append((seat, move_time, stats.get('iterations')))
+            if time_limit is not None and move_time > time_limit + grace:
+                print("%s took %.3f s for a move, over the %.3f s limit" % (names[seat], move_time, time_limit))
+                if strict:
+                    forfeit = seat
+                    break
+            state = board.next_state(state, action)
+
+        if forfeit is not None:
+            winner = 'p2' if forfeit == 'p1' else 'p1'
+        else:
+            final_score = board.points_values(state)
+            winner = 'draw'
+            if final_score[1] == 1:
+                winner = seats[1]
+            elif final_score[2] == 1:
+                winner = seats[2]
+        print("Finished! Winner: %s" % (names[winner] if winner != 'draw' else 'draw'))
+
+    return {'round': number, 'seed': seed, 'first': seats[1], 'winner': winner, 'forfeit': forfeit is not None,
+            'moves': moves}
+
+
+def percentile(values, fraction):
+    """ The value below which the given fraction of the sorted values lies (nearest rank). """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def elo(score):
+    """ The Elo rating difference that predicts the given expected score; None for scores of 0 or 1, which no
+    finite difference predicts. """
+    if score <= 0 or score >= 1:
+        return None
+    return -400 * log10(1 / score - 1)
+
+
+def summarize(results, p1, p2):
+    """ Computes the tournament statistics from the round results: the score of p1 (a win counts 1, a draw 1/2)
+    with its 95% confidence interval, the matching Elo difference, and the latency percentiles and iteration
+    counts of each bot's moves. """
+    n = len(results)
+    scores = [1. if r['winner'] == 'p1' else 0.5 if r['winner'] == 'draw' else 0. for r in results]
+    score = sum(scores) / n
+    deviation = sqrt(sum((s - score) ** 2 for s in scores) / (n - 1)) if n > 1 else 0.
+    margin = 1.96 * deviation / sqrt(n)
+    low, high = max(0., score - margin), min(1., score + margin)
+
+    summary = {
+        'p1': p1, 'p2': p2, 'rounds': n,
+        'wins': {'p1': sum(r['winner'] == 'p1' for r in results), 'p2': sum(r['winner'] == 'p2' for r in results),
+                 'draw': sum(r['winner'] == 'draw' for r in results)},
+        'forfeits': sum(r['forfeit'] for r in results),
+        'p1_score': score,
+        'p1_score_ci95': [low, high],
+        'p1_elo': elo(score),
+        'p1_elo_ci95': [elo(low), elo(high)],
+        'bots': {},
+    }
+    for seat in ('p1', 'p2'):
+        latencies = [seconds for r in results for s, seconds, _ in r['moves'] if s == seat]
+        iterations = [count for r in results for s, _, count in r['moves'] if s == seat and count is not None]
+        summary['bots'][seat] = {
+            'name': p1 if seat == 'p1' else p2,
+            'moves': len(latencies),
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+            'latency_max': max(latencies, default=None),
+            'iterations_mean': sum(iterations) / len(iterations) if iterations else None,
+            'iterations_p50': percentile(iterations, 0.5),
+        }
+    return summary
+
+
+def write_csv(filename, results, p1, p2):
+    """ Writes one row per round. """
+    names = {'p1': p1, 'p2': p2, 'draw': 'draw'}
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['round', 'seed', 'first', 'winner', 'forfeit', 'moves',
+                         'p1_latency_max', 'p2_latency_max'])
+        for r in results:
+            writer.writerow([r['round'], r['seed'], names[r['first']], names[r['winner']], r['forfeit'],
+                             len(r['moves']),
+                             max((t for s, t, _ in r['moves'] if s == 'p1'), default=''),
+                             max((t for s, t, _ in r['moves'] if s == 'p2'), default='')])
+
+
+# The guard keeps worker processes from running the tournament when they import this module.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plays a tournament of Ultimate Tic-Tac-Toe between two bots.")
+    parser.add_argument('p1', choices=sorted(players))
+    parser.add_argument('p2', choices=sorted(players))
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help="seconds per move for both players (by default the bots use their node counts)")
+    parser.add_argument('--grace', type=float, default=0.05,
+                        help="seconds a move may run over the time limit before it counts as an overrun")
+    parser.add_argument('--strict', action='store_true', help="a player loses the round on an overrun")
+    parser.add_argument('--processes', type=int, default=1, help="rounds played at once, one per process")
+    parser.add_argument('--seed', type=int, default=0, help="round i is played with seed + i")
+    parser.add_argument('--fixed-colors', action='store_true',
+                        help="p1 always moves first (by default the first move alternates between rounds)")
+    parser.add_argument('--quiet', action='store_true', help="only print the results")
+    parser.add_argument('--json', help="file to write the summary and round results to")
+    parser.add_argument('--csv', help="file to write one line per round to")
+    args = parser.parse_args()
+
+    if args.processes > 1 and multiprocess_players & {args.p1, args.p2}:
+        parser.error("%s starts its own processes; use --processes 1" % " and ".join(
+            sorted(multiprocess_players & {args.p1, args.p2})))
+
+    tasks = [(i, args.p1, args.p2, args.seed + i, not args.fixed_colors and i % 2 == 1,
+              args.time_limit, args.grace, args.strict, args.quiet) for i in range(args.rounds)]
+
+    start = time()  # To log how much time the simulation takes.
+    if args.processes > 1:
+        with Pool(args.processes) as pool:
+            results = pool.map(play_game, tasks, chunksize=1)
+    else:
+        results = [play_game(task) for task in tasks]
+    elapsed = time() - start
+
+    summary = summarize(results, args.p1, args.p2)
+    summary['seconds'] = elapsed
 
     print("")
-    print("Round %d, fight!" % i)
-
-    state = state0
-    last_action = None
-    current_player = player1
-    while not board.is_ended(state):
-        last_action = current_player(board, state)
-        state = board.next_state(state, last_action)
-        current_player = player1 if current_player == player2 else player2
-    print("Finished!")
-    print()
-    final_score = board.points_values(state)
-    winner = 'draw'
-    if final_score[1] == 1:
-        winner = 1
-    elif final_score[2] == 1:
-        winner = 2
-    print("The %s bot wins this round! (%s)" % (winner, str(final_score)))
-    wins[winner] = wins.get(winner, 0) + 1
-
-print("")
-print("Final win counts:", dict(wins))
-
-# Also output the time elapsed.
-end = time()
-print(end - start, ' seconds')
+    print("%s against %s, %d rounds in %.1f s" % (args.p1, args.p2, summary['rounds'], elapsed))
+    print("Wins: %s %d, %s %d, draws %d" % (args.p1, summary['wins']['p1'], args.p2, summary['wins']['p2'],
+                                            summary['wins']['draw']))
+    print("Score of %s: %.3f (95%% CI %.3f-%.3f), Elo difference %s (95%% CI %s to %s)" % (
+        args.p1, summary['p1_score'], summary['p1_score_ci95'][0], summary['p1_score_ci95'][1],
+        *("-" if value is None else "%+.0f" % value for value in [summary['p1_elo']] + summary['p1_elo_ci95'])))
+    for seat in ('p1', 'p2'):
+        bot = summary['bots'][seat]
+        if bot['moves']:
+            line = "%s: %d moves, latency p50 %.3f s, p95 %.3f s, max %.3f s" % (
+                bot['name'], bot['moves'], bot['latency_p50'], bot['latency_p95'], bot['latency_max'])
+            if bot['iterations_mean'] is not None:
+                line += ", %.0f iterations per move" % bot['iterations_mean']
+            print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'rounds': results}, f, indent=1)
+    if args.csv:
+        write_csv(args.csv, results, args.p1, args.p2)
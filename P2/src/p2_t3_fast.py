@@ -0,0 +1,189 @@
+import p2_t3
+
+num_players = 2
+
+# A state of the fast engine is the tuple (p1_cells, p2_cells, p1_boards, p2_boards, constraint, player):
+#   p1_cells, p2_cells:   81-bit masks of each player's pieces; sub-board k = 3 * R + C owns bits 9 * k to 9 * k + 8,
+#                         laid out like the 9-bit masks of p2_t3 (bit 3 * r + c).
+#   p1_boards, p2_boards: 9-bit masks of the finished sub-boards, as in p2_t3 (a full board sets both).
+#   constraint:           the index k of the sub-board the next move must be played in, or None.
+#   player:               the player number to move.
+# Actions are integers 9 * k + 3 * r + c instead of (R, C, r, c) tuples; see action_index and action_tuple.
+
+WIN = tuple(any(mask & w == w for w in p2_t3.Board.wins) for mask in range(512))
+
+# The moves of sub-board k whose cells are free in a 9-bit mask, in the order of p2_t3.Board.legal_actions.
+MOVES = tuple(
+    tuple(tuple(9 * k + cell for cell in range(9) if free >> cell & 1) for free in range(512))
+    for k in range(9)
+)
+
+# The sub-board and cell of every action, and its bit in the cell masks.
+ACTION_BOARD = tuple(action // 9 for action in range(81))
+ACTION_CELL = tuple(action % 9 for action in range(81))
+ACTION_BIT = tuple(1 << action for action in range(81))
+
+
+def action_index(action):
+    """ Converts an (R, C, r, c) action of p2_t3.Board into an action of the fast engine. """
+    R, C, r, c = action
+    return 9 * (3 * R + C) + 3 * r + c
+
+
+def action_tuple(action):
+    """ Converts an action of the fast engine into an (R, C, r, c) action of p2_t3.Board. """
+    k, cell = divmod(action, 9)
+    return k // 3, k % 3, cell // 3, cell % 3
+
+
+def from_board_state(state):
+    """ Converts a p2_t3.Board state into a state of the fast engine. """
+    p1_cells = p2_cells = 0
+    for k in range(9):
+        p1_cells |= state[2 * k] << 9 * k
+        p2_cells |= state[2 * k + 1] << 9 * k
+    constraint = None if state[20] is None else 3 * state[20] + state[21]
+    return p1_cells, p2_cells, state[18], state[19], constraint, state[22]
+
+
+def to_board_state(state):
+    """ Converts a state of the fast engine into a p2_t3.Board state. """
+    p1_cells, p2_cells, p1_boards, p2_boards, constraint, player = state
+    result = []
+    for k in range(9):
+        result.append(p1_cells >> 9 * k & 0x1ff)
+        result.append(p2_cells >> 9 * k & 0x1ff)
+    if constraint is None:
+        result.extend((p1_boards, p2_boards, None, None, player))
+    else:
+        result.extend((p1_boards, p2_boards, constraint // 3, constraint % 3, player))
+    return tuple(result)
+
+
+class FastBoard(object):
+    """ Ultimate Tic-Tac-Toe rules over bitmask states, with the interface of p2_t3.Board.
+
+    Every method gives the same result as its p2_t3.Board counterpart on the converted state and actions. Winning
+    lines are looked up in the 512-entry WIN table instead of being tested one by one, and legal moves are read off
+    the MOVES table for the free cells of each open sub-board.
+    """
+    wins = p2_t3.Board.wins
+
+    def starting_state(self):
+        return 0, 0, 0, 0, None, 1
+
+    def display(self, state, action, _unicode=True):
+        if action is not None:
+            action = action_tuple(action)
+        return p2_t3.Board().display(to_board_state(state), action, _unicode)
+
+    def pack_action(self, notation):
+        action = p2_t3.Board().pack_action(notation)
+        if action is None or not all(0 <= x < 3 for x in action):
+            return
+        return action_index(action)
+
+    def unpack_action(self, action):
+        try:
+            return '{0} {1} {2} {3}'.format(*action_tuple(action))
+        except Exception:
+            return ''
+
+    def display_action(self, action):
+        return self.unpack_action(action)
+
+    def next_state(self, state, action):
+        p1_cells, p2_cells, p1_boards, p2_boards, constraint, player = state
+        k = ACTION_BOARD[action]
+        shift = 9 * k
+
+        if player == 1:
+            p1_cells |= ACTION_BIT[action]
+            mine = p1_cells >> shift & 0x1ff
+            if WIN[mine]:
+                p1_boards |= 1 << k
+            elif mine | p2_cells >> shift & 0x1ff == 0x1ff:
+                p1_boards |= 1 << k
+                p2_boards |= 1 << k
+        else:
+            p2_cells |= ACTION_BIT[action]
+            mine = p2_cells >> shift & 0x1ff
+            if WIN[mine]:
+                p2_boards |= 1 << k
+            elif mine | p1_cells >> shift & 0x1ff == 0x1ff:
+                p1_boards |= 1 << k
+                p2_boards |= 1 << k
+
+        cell = ACTION_CELL[action]
+        constraint = None if (p1_boards | p2_boards) >> cell & 1 else cell
+        return p1_cells, p2_cells, p1_boards, p2_boards, constraint, 3 - player
+
+    def is_legal(self, state, action):
+        if not isinstance(action, int) or not 0 <= action < 81:
+            return False
+        p1_cells, p2_cells, p1_boards, p2_boards, constraint, _ = state
+        k = ACTION_BOARD[action]
+        if (p1_cells | p2_cells) & ACTION_BIT[action]:
+            return False
+        if (p1_boards | p2_boards) >> k & 1:
+            return False
+        return constraint is None or constraint == k
+
+    def legal_actions(self, state):
+        p1_cells, p2_cells, p1_boards, p2_boards, constraint, _ = state
+        occupied = p1_cells | p2_cells
+        if constraint is not None:
+            return list(MOVES[constraint][~occupied >> 9 * constraint & 0x1ff])
+
+        finished = p1_boards | p2_boards
+        actions = []
+        for k in range(9):
+            if not finished >> k & 1:
+                actions.extend(MOVES[k][~occupied >> 9 * k & 0x1ff])
+        return actions
+
+    def previous_player(self, state):
+        return 3 - state[-1]
+
+    def current_player(self, state):
+        return state[-1]
+
+    def is_ended(self, state):
+        p1_boards, p2_boards = state[2], state[3]
+        return (WIN[p1_boards & ~p2_boards] or WIN[p2_boards & ~p1_boards]
+                or p1_boards | p2_boards == 0x1ff)
+
+    def win_values(self, state):
+        p1_boards, p2_boards = state[2], state[3]
+        if WIN[p1_boards & ~p2_boards]:
+            return {1: 1, 2: 0}
+        if WIN[p2_boards & ~p1_boards]:
+            return {1: 0, 2: 1}
+        if p1_boards | p2_boards == 0x1ff:
+            return {1: 0.5, 2: 0.5}
+
+    def owned_boxes(self, state):
+        p1 = state[2] & ~state[3]
+        p2 = state[3] & ~state[2]
+        ret = {}
+        for y in range(3):
+            for x in range(3):
+                if p1 >> (3 * y + x) & 1:
+                    ret[(y, x)] = 1
+                elif p2 >> (3 * y + x) & 1:
+                    ret[(y, x)] = 2
+                else:
+                    ret[(y, x)] = 0
+        return ret
+
+    def points_values(self, state):
+        p1_boards, p2_boards = state[2], state[3]
+        if WIN[p1_boards & ~p2_boards]:
+            return {1: 1, 2: -1}
+        if WIN[p2_boards & ~p1_boards]:
+            return {1: -1, 2: 1}
+        if p1_boards | p2_boards == 0x1ff:
+            return {1: 0, 2: 0}
+
+    def winner_message(self, winners):
+        return p2_t3.Board().winner_message(winners)
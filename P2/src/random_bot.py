@@ -1,5 +1,5 @@
 from random import choice
 
-def think(board, state):
+def think(board, state, time_limit=None):
     """ Returns a random move. """
     return choice(board.legal_actions(state))
@@ -1,16 +1,18 @@
 import random
+from timeit import default_timer as time
 
 ROLLOUTS = 10
 MAX_DEPTH = 5
 
 
-def think(board, state):
+def think(board, state, time_limit=None):
     """ For each possible move, this bot plays ROLLOUTS random games to depth MAX_DEPTH then averages the
     score as an estimate of how good the move is.
 
     Args:
         board:  The game setup.
         state:  The state of the game.
+        time_limit: Seconds for the move; the moves not evaluated by then are skipped.
 
     Returns:    The action with the maximal score given the rollouts.
 
@@ -21,6 +23,7 @@ def think(board, state):
     best_expectation = float('-inf')
 
     me = board.current_player(state)
+    deadline = None if time_limit is None else time() + time_limit
 
     # Define a helper function to calculate the difference between the bot's score and the opponent's.
     def outcome(owned_boxes, game_points):
@@ -34,6 +37,9 @@ def think(board, state):
         return red_score - blue_score if me == 1 else blue_score - red_score
 
     for move in moves:
+        # The first move is always evaluated, so there is an expectation to report.
+        if deadline is not None and best_expectation > float('-inf') and time() >= deadline:
+            break
         total_score = 0.0
 
         # Sample a set number of games where the target move is immediately applied.
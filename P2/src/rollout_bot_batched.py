@@ -0,0 +1,166 @@
+import random
+from timeit import default_timer as time
+
+import numpy
+
+from p2_t3 import Board
+
+# Same estimate as rollout_bot, with 100 times the rollouts: the games of every move are played in batches as rows of
+# NumPy arrays, one ply per step for all of them.
+ROLLOUTS = 1000
+MAX_DEPTH = 5
+# Rollouts per move played in one batch; under a time limit, no new batch starts unless it would end by the deadline.
+CHUNK = 100
+
+# Rollouts per move and duration of the last move
+last_think_stats = {}
+
+# Lookup tables over 9-bit masks
+WIN = numpy.array([any(mask & w == w for w in Board.wins) for mask in range(512)])
+POPCOUNT = numpy.array([bin(mask).count('1') for mask in range(512)], numpy.int64)
+# NTH_CELL[mask, n] is the cell of the n-th set bit of mask (0 past the last one).
+NTH_CELL = numpy.zeros((512, 9), numpy.int64)
+for _mask in range(512):
+    _cells = [cell for cell in range(9) if _mask >> cell & 1]
+    NTH_CELL[_mask, :len(_cells)] = _cells
+
+
+class RolloutBatch:
+    def __init__(self, state, count):
+        """ count copies of a p2_t3.Board state, held as arrays with one row per game.
+
+        Attributes:
+            cells:      (count, 2, 9) masks of each player's pieces in each sub-board.
+            boards:     (count, 2) masks of the sub-boards each player won (a full board sets both).
+            constraint: (count,) index 3 * R + C of the sub-board the next move must be played in, or -1.
+            player:     (count,) index (0 or 1) of the player to move.
+            ended:      (count,) whether the game is over.
+
+        """
+        self.cells = numpy.empty((count, 2, 9), numpy.int64)
+        self.cells[:, 0, :] = state[0:18:2]
+        self.cells[:, 1, :] = state[1:18:2]
+        self.boards = numpy.empty((count, 2), numpy.int64)
+        self.boards[:] = state[18], state[19]
+        self.constraint = numpy.full(count, -1 if state[20] is None else 3 * state[20] + state[21], numpy.int64)
+        self.player = numpy.full(count, state[22] - 1, numpy.int64)
+        self.ended = numpy.zeros(count, bool)
+        self.update_ended()
+
+    def __len__(self):
+        return len(self.player)
+
+    def update_ended(self):
+        p1, p2 = self.boards[:, 0], self.boards[:, 1]
+        self.ended = WIN[p1 & ~p2 & 0x1ff] | WIN[p2 & ~p1 & 0x1ff] | ((p1 | p2) == 0x1ff)
+
+    def free_cells(self, games):
+        """ The (len(games), 9) masks of the cells the given games may play in next, when their next move is not
+        constrained to a sub-board. """
+        occupied = self.cells[games, 0, :] | self.cells[games, 1, :]
+        finished = self.boards[games, 0] | self.boards[games, 1]
+        allowed = (finished[:, None] >> numpy.arange(9) & 1) == 0
+        return numpy.where(allowed, ~occupied & 0x1ff, 0)
+
+    def play(self, games, boards, cells):
+        """ Plays the move (board, cell) in each of the given games. """
+        players = self.player[games]
+        self.cells[games, players, boards] |= 1 << cells
+        mine = self.cells[games, players, boards]
+        theirs = self.cells[games, 1 - players, boards]
+
+        won = WIN[mine]
+        full = ~won & ((mine | theirs) == 0x1ff)
+        self.boards[games[won], players[won]] |= 1 << boards[won]
+        self.boards[games[full], 0] |= 1 << boards[full]
+        self.boards[games[full], 1] |= 1 << boards[full]
+
+        finished = self.boards[games, 0] | self.boards[games, 1]
+        self.constraint[games] = numpy.where(finished >> cells & 1, -1, cells)
+        self.player[games] = 1 - players
+
+    def step(self, rng):
+        """ Plays a uniformly random legal move in every game that is not over. """
+        games = numpy.flatnonzero(~self.ended)
+        if not games.size:
+            return
+        constraint = self.constraint[games]
+        constrained = constraint >= 0
+
+        # Most games must play in one sub-board: pick the n-th of its free cells.
+        fixed_games, fixed_boards = games[constrained], constraint[constrained]
+        free = ~(self.cells[fixed_games, 0, fixed_boards] | self.cells[fixed_games, 1, fixed_boards]) & 0x1ff
+        n = (rng.random(fixed_games.size) * POPCOUNT[free]).astype(numpy.int64)
+        fixed_cells = NTH_CELL[free, n]
+
+        # The others pick the n-th free cell of all their open sub-boards, counting board by board.
+        open_games = games[~constrained]
+        free = self.free_cells(open_games)
+        rows = numpy.arange(open_games.size)
+        counts = POPCOUNT[free]
+        totals = counts.cumsum(axis=1)
+        n = (rng.random(open_games.size) * totals[:, -1]).astype(numpy.int64)
+        open_boards = (totals <= n[:, None]).sum(axis=1)
+        before = totals[rows, open_boards] - counts[rows, open_boards]
+        open_cells = NTH_CELL[free[rows, open_boards], n - before]
+
+        self.play(numpy.concatenate((fixed_games, open_games)), numpy.concatenate((fixed_boards, open_boards)),
+                  numpy.concatenate((fixed_cells, open_cells)))
+        self.update_ended()
+
+    def outcome(self, me):
+        """ The score of each game for player me, as rollout_bot.think counts it: 18 or -18 for a game won or lost,
+        otherwise the difference between the numbers of sub-boards won. """
+        p1, p2 = self.boards[:, 0], self.boards[:, 1]
+        p1_won, p2_won = p1 & ~p2 & 0x1ff, p2 & ~p1 & 0x1ff
+        difference = numpy.where(WIN[p1_won], 18, numpy.where(WIN[p2_won], -18, 0))
+        difference = numpy.where(self.ended, difference, POPCOUNT[p1_won] - POPCOUNT[p2_won])
+        return difference if me == 1 else -difference
+
+
+def think(board, state, time_limit=None):
+    """ For each possible move, this bot plays ROLLOUTS random games to depth MAX_DEPTH, CHUNK games per move at
+    once as a batch, then averages the score as an estimate of how good the move is.
+
+    Args:
+        board:  The game setup.
+        state:  The state of the game.
+        time_limit: Seconds for the move; the batches that would end past it are skipped, so that fewer rollouts
+                    may be averaged.
+
+    Returns:    The action with the maximal score given the rollouts.
+
+    """
+    start = time()
+    moves = board.legal_actions(state)
+    me = board.current_player(state)
+    rng = numpy.random.default_rng(random.getrandbits(64))
+    deadline = None if time_limit is None else start + time_limit
+
+    boards = [3 * R + C for R, C, r, c in moves]
+    cells = [3 * r + c for R, C, r, c in moves]
+    totals = numpy.zeros(len(moves))
+    played = 0
+    batch_seconds = 0.
+    # The first batch is always played, so there is an expectation to report. The next ones are expected to take as
+    # long as the last one.
+    while played < ROLLOUTS and (played == 0 or deadline is None or time() + batch_seconds < deadline):
+        batch_start = time()
+        chunk = min(CHUNK, ROLLOUTS - played)
+        # Rows i * chunk to (i + 1) * chunk are the rollouts of moves[i].
+        batch = RolloutBatch(state, len(moves) * chunk)
+        games = numpy.arange(len(batch))
+        batch.play(games, numpy.repeat(boards, chunk), numpy.repeat(cells, chunk))
+        batch.update_ended()
+        for i in range(MAX_DEPTH):
+            batch.step(rng)
+        totals += batch.outcome(me).reshape(len(moves), chunk).sum(axis=1)
+        played += chunk
+        batch_seconds = time() - batch_start
+
+    expectations = totals / played
+    best = int(numpy.argmax(expectations))
+    last_think_stats.clear()
+    last_think_stats.update(rollouts=played, seconds=time() - start)
+    print("Rollout bot picking %s with expected score %f" % (str(moves[best]), expectations[best]))
+    return moves[best]
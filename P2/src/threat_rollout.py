@@ -0,0 +1,92 @@
+import random
+
+from p2_t3_fast import FastBoard, MOVES, WIN, from_board_state, to_board_state
+
+# Rollout policy for Ultimate Tic-Tac-Toe over the fast engine: win a board when possible (preferring a board that
+# wins the game), otherwise block the opponent from winning one, otherwise play at random. Each player's threats
+# (the free or taken cells that would complete one of their lines) are kept as an 81-bit mask laid out like the
+# cell masks of p2_t3_fast, and only the segment of the board just played in is updated after each move.
+
+
+def _threats(mask):
+    """ The cells that would complete a line of a 9-bit mask holding two of its three cells. """
+    threats = 0
+    for w in FastBoard.wins:
+        if bin(w & mask).count('1') == 2:
+            threats |= w & ~mask
+    return threats
+
+
+THREATS = tuple(_threats(mask) for mask in range(512))
+
+# The cells of the boards set in a 9-bit mask of boards, as an 81-bit mask.
+BOARD_CELLS = tuple(sum(0x1ff << 9 * k for k in range(9) if boards >> k & 1) for boards in range(512))
+
+
+def threat_masks(state):
+    """ Computes the 81-bit threat masks of both players from scratch. """
+    p1_cells, p2_cells = state[0], state[1]
+    p1_threats = p2_threats = 0
+    for k in range(9):
+        p1_threats |= THREATS[p1_cells >> 9 * k & 0x1ff] << 9 * k
+        p2_threats |= THREATS[p2_cells >> 9 * k & 0x1ff] << 9 * k
+    return p1_threats, p2_threats
+
+
+def moves_in(cells, constraint):
+    """ The actions for the cells set in an 81-bit mask; constraint, if not None, is the only board they are in. """
+    if constraint is not None:
+        return MOVES[constraint][cells >> 9 * constraint & 0x1ff]
+    actions = []
+    for k in range(9):
+        segment = cells >> 9 * k & 0x1ff
+        if segment:
+            actions.extend(MOVES[k][segment])
+    return actions
+
+
+def choose_action(state, p1_threats, p2_threats):
+    """ Picks the move of the player to move in a non-terminal state of the fast engine. """
+    p1_cells, p2_cells, p1_boards, p2_boards, constraint, player = state
+    finished = p1_boards | p2_boards
+    if constraint is None:
+        free = ~(p1_cells | p2_cells) & BOARD_CELLS[~finished & 0x1ff]
+    else:
+        free = ~(p1_cells | p2_cells) & 0x1ff << 9 * constraint
+
+    if player == 1:
+        mine, theirs, won = p1_threats, p2_threats, p1_boards & ~p2_boards
+    else:
+        mine, theirs, won = p2_threats, p1_threats, p2_boards & ~p1_boards
+
+    wins = mine & free
+    if wins:
+        # A board that completes a line of won boards wins the game.
+        game_wins = wins & BOARD_CELLS[THREATS[won] & ~finished & 0x1ff]
+        return random.choice(moves_in(game_wins or wins, constraint))
+    blocks = theirs & free
+    return random.choice(moves_in(blocks or free, constraint))
+
+
+def rollout_fast(state):
+    """ Plays a state of the fast engine out to the end with the threat policy and returns the final state. """
+    board = FastBoard()
+    p1_threats, p2_threats = threat_masks(state)
+    while not (WIN[state[2] & ~state[3]] or WIN[state[3] & ~state[2]] or state[2] | state[3] == 0x1ff):
+        action = choose_action(state, p1_threats, p2_threats)
+        state = board.next_state(state, action)
+
+        # Only the board just played in changed; refresh the mover's threats there.
+        shift = 9 * (action // 9)
+        if state[5] == 2:
+            p1_threats = p1_threats & ~(0x1ff << shift) | THREATS[state[0] >> shift & 0x1ff] << shift
+        else:
+            p2_threats = p2_threats & ~(0x1ff << shift) | THREATS[state[1] >> shift & 0x1ff] << shift
+    return state
+
+
+def rollout(board, state):
+    """ Same interface as the rollout functions of the MCTS bots, for p2_t3.Board and FastBoard states. """
+    if isinstance(board, FastBoard):
+        return rollout_fast(state)
+    return to_board_state(rollout_fast(from_board_state(state)))
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from math import sqrt, log
+from timeit import default_timer as time
+
+from mcts_node import MCTSNode
+
+# Replacement policies of TranspositionTable
+POLICIES = ('never', 'fifo', 'lru')
+
+
+class TranspositionTable:
+    def __init__(self, capacity=100000, policy='lru'):
+        """ A table of MCTS nodes keyed on the game state, so positions reached by different move orders share a
+        node and its statistics.
+
+        Args:
+            capacity:   The maximum number of nodes held.
+            policy:     What happens when the table is full: 'never' stores no more nodes, 'fifo' drops the oldest
+                        node stored, 'lru' drops the node looked up least recently.
+
+        """
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of %s" % ", ".join(POLICIES))
+        self.capacity = capacity
+        self.policy = policy
+        self.nodes = OrderedDict()              # State -> MCTSNode, oldest (or least recently used) first
+
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, state):
+        """ Returns the node of a state, or None if the table does not hold it. """
+        self.lookups += 1
+        node = self.nodes.get(state)
+        if node is not None:
+            self.hits += 1
+            if self.policy == 'lru':
+                self.nodes.move_to_end(state)
+        return node
+
+    def store(self, state, node):
+        """ Stores the node of a state, making room according to the replacement policy. """
+        if len(self.nodes) >= self.capacity:
+            if self.policy == 'never':
+                return
+            _, dropped = self.nodes.popitem(last=False)
+            # Unlink the dropped node from the parent that created it so it can be freed; other parents that
+            # reached it by transposition keep it until they are dropped as well.
+            parent = dropped.parent
+            if parent is not None and parent.child_nodes.get(dropped.parent_action) is dropped:
+                del parent.child_nodes[dropped.parent_action]
+                parent.untried_actions.append(dropped.parent_action)
+        self.nodes[state] = node
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.
+
+    def clear(self):
+        self.nodes.clear()
+        self.lookups = self.hits = 0
+
+
+def search(board, current_state, table, rollout, is_win, explore_faction, iterations=None, time_limit=None):
+    """ MCTS over the graph of positions held by a transposition table, instead of a tree.
+
+    Every node is looked up in the table by its state when it is expanded, so it may have several parents. Nodes
+    are therefore scored with the visits of the parent the search came from, and results are backpropagated along
+    the path the iteration actually took rather than through parent links.
+
+    Args:
+        board:              The game setup.
+        current_state:      The state to search from.
+        table:              The TranspositionTable of the searching player; it is kept between moves.
+        rollout:            The rollout function of the bot.
+        is_win:             The is_win function of the bot.
+        explore_faction:    The exploration parameter of the UCB formula.
+        iterations:         The number of iterations, when there is no time_limit.
+        time_limit:         Seconds to search for.
+
+    Returns:    The root node and the number of iterations run.
+
+    """
+    start = time()
+    deadline = None if time_limit is None else start + time_limit
+    bot_identity = board.current_player(current_state)
+
+    root_node = table.get(current_state)
+    if root_node is None:
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
+        table.store(current_state, root_node)
+
+    done = 0
+    while (done < iterations) if deadline is None else (done == 0 or time() < deadline):
+        node, state = root_node, current_state
+        path = [node]
+
+        # Selection, scoring each child with the visits of the node the path came through
+        while not board.is_ended(state) and not node.untried_actions and node.child_nodes:
+            is_opponent = board.current_player(state) != bot_identity
+            best_value, best_action = float('-inf'), None
+            for action, child in node.child_nodes.items():
+                if child.visits == 0:
+                    value = float('inf')
+                else:
+                    win_rate = child.wins / child.visits
+                    if is_opponent:
+                        win_rate = 1 - win_rate
+                    value = win_rate + explore_faction * sqrt(log(node.visits) / child.visits)
+                if value > best_value:
+                    best_value, best_action = value, action
+            node = node.child_nodes[best_action]
+            state = board.next_state(state, best_action)
+            path.append(node)
+
+        # Expansion, joining the node of the new state if another move order already reached it
+        if not board.is_ended(state) and node.untried_actions:
+            action = node.untried_actions.pop(0)
+            state = board.next_state(state, action)
+            child = table.get(state)
+            if child is None:
+                child = MCTSNode(parent=node, parent_action=action, action_list=board.legal_actions(state))
+                table.store(state, child)
+            node.child_nodes[action] = child
+            path.append(child)
+
+        won = is_win(board, rollout(board, state), bot_identity)
+        for node in path:
+            node.visits += 1
+            if won:
+                node.wins += 1
+        done += 1
+
+    return root_node, done